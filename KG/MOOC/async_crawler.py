@@ -0,0 +1,275 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from cache import CacheMiss
+from creeper import MoocCrawler, BASE_URL, SEARCH_URL, USER_AGENT
+
+
+class HostRateLimiter:
+    """按域名限速：同一域名相邻两次请求的间隔不小于 1/rate 秒"""
+
+    def __init__(self, rate_per_host):
+        self.interval = 1.0 / rate_per_host if rate_per_host and rate_per_host > 0 else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncMoocCrawler(MoocCrawler):
+    """
+    异步并发爬虫：所有请求共用一个 httpx.AsyncClient，
+    通过信号量限制并发数，通过 HostRateLimiter 限制单域名请求速率。
+    解析逻辑与 MoocCrawler 共用。
+    """
+
+    def __init__(self, concurrency=8, rate_per_host=5.0, timeout=10, cache=None, parser=None):
+        super().__init__(cache, parser)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate_per_host)
+        self.semaphore = None
+        self.client = None
+
+    async def init_session_async(self):
+        """创建共享的 HTTP 客户端并获取 CSRF Token"""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        if self.offline:
+            self.headers = self.build_headers(None)
+            print(f"[+] 离线模式：只从缓存读取 ({self.cache.cache_dir})")
+            return
+
+        await self._request("GET", BASE_URL)
+        self.csrf = self.client.cookies.get("NTESSTUDYSI")
+        if not self.csrf:
+            raise Exception("未能获取 csrf token (NTESSTUDYSI)")
+        self.headers = self.build_headers(self.csrf)
+        print(f"[+] 会话初始化成功 (并发数 {self.concurrency})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _request(self, method, url, **kwargs):
+        # 先排队等限速时间片再占并发名额，等待限速的请求不会占满并发数
+        await self.limiter.wait(url)
+        async with self.semaphore:
+            resp = await self.client.request(method, url, **kwargs)
+            resp.raise_for_status()
+            return resp
+
+    async def _cached_async(self, endpoint, url, payload, fetch):
+        """异步版 _cached：fetch 为返回响应文本的协程函数；缓存的 gzip 读写放到线程池中，避免阻塞事件循环"""
+        if self.cache is not None:
+            body = await asyncio.to_thread(self.cache.get, endpoint, url, payload)
+            if body is not None:
+                return body
+            if self.cache.offline:
+                raise CacheMiss(f"离线模式下缓存未命中: {url}")
+
+        body = await fetch()
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, endpoint, url, payload, body)
+        return body
+
+    async def _search_page_text_async(self, keyword, page_index=1, page_size=20):
+        form = self.search_form(keyword, page_index, page_size)
+
+        async def fetch():
+            resp = await self._request("POST", f"{SEARCH_URL}?csrfKey={self.csrf}", headers=self.headers, data=form)
+            return resp.text
+
+        return await self._cached_async("search", SEARCH_URL, form, fetch)
+
+    async def _course_page_text_async(self, school_short, course_id):
+        url = self.course_url(school_short, course_id)
+
+        async def fetch():
+            resp = await self._request("GET", url, headers=self.headers)
+            return resp.text
+
+        return await self._cached_async("course", url, None, fetch)
+
+    async def search_course_async(self, keyword):
+        """异步搜索课程"""
+        try:
+            result = json.loads(await self._search_page_text_async(keyword))
+            return self.parse_search_result(result)
+        except Exception as e:
+            print(f"[-] 搜索出错 ({keyword}): {e}")
+            return []
+
+    async def _search_page_async(self, keyword, page_index, page_size):
+        result = json.loads(await self._search_page_text_async(keyword, page_index, page_size))
+        return self.parse_search_page(result, page_size)
+
+    async def search_all_pages_async(self, keyword, page_size=20, max_pages=None):
+        """
+        获取关键词的全部搜索结果：先取第 1 页得到总页数，再并发获取其余各页
+
+        Returns:
+            (课程列表, complete)；有页面出错时 complete 为 False
+        """
+        try:
+            courses, total_pages = await self._search_page_async(keyword, 1, page_size)
+        except Exception as e:
+            print(f"[-] 搜索出错 ({keyword}): {e}")
+            return [], False
+
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+
+        pages = await asyncio.gather(
+            *(self._search_page_async(keyword, i, page_size) for i in range(2, total_pages + 1)),
+            return_exceptions=True
+        )
+        complete = True
+        for page_index, page in enumerate(pages, start=2):
+            if isinstance(page, Exception):
+                print(f"[-] 搜索出错 ({keyword} 第 {page_index} 页): {page}")
+                complete = False
+                continue
+            courses.extend(page[0])
+
+        print(f"[+] {keyword}: {total_pages} 页，共 {len(courses)} 门课程")
+        return courses, complete
+
+    async def fetch_outline_async(self, school_short, course_id):
+        """异步获取详情页并解析大纲；请求出错时直接抛出异常"""
+        page_text = await self._course_page_text_async(school_short, course_id)
+        # 解析是 CPU 密集操作，放到线程池中避免阻塞事件循环
+        return await asyncio.to_thread(self.parse_outline, page_text)
+
+    async def fetch_and_parse_outline_async(self, school_short, course_id):
+        """异步获取详情页并解析大纲"""
+        try:
+            return await self.fetch_outline_async(school_short, course_id)
+        except Exception as e:
+            print(f"   [-] {school_short}-{course_id} 获取失败: {e}")
+            return []
+
+    async def crawl_course(self, meta, on_record=None):
+        titles = await self.fetch_and_parse_outline_async(meta["school"], meta["course_id"])
+        record = dict(meta, titles=titles)
+        if titles:
+            print(f"[+] {meta['school']}-{meta['course_id']}: 提取到 {len(titles)} 条大纲内容")
+            if on_record is not None:
+                on_record(record)
+        return record
+
+    async def search_keyword_async(self, keyword, max_courses=None, max_pages=None):
+        """返回 (课程元数据列表, complete)"""
+        courses, complete = await self.search_all_pages_async(keyword, max_pages=max_pages)
+        return self.keyword_metas(keyword, courses, max_courses), complete
+
+    async def discover_courses(self, keywords, max_courses=None, max_pages=None):
+        """并发搜索多个关键词的全部结果页，返回按课程ID去重后的课程元数据"""
+        results = await asyncio.gather(*(self.search_keyword_async(kw, max_courses, max_pages) for kw in keywords))
+
+        metas = []
+        seen = set()
+        for found, _ in results:
+            for meta in found:
+                # 不同关键词可能搜到同一门课程，只保留第一次出现的
+                if meta["course_id"] in seen:
+                    continue
+                seen.add(meta["course_id"])
+                metas.append(meta)
+        return metas
+
+    async def crawl(self, keywords, max_courses=None, max_pages=None, on_record=None):
+        """
+        并发抓取多个关键词下所有课程的大纲
+
+        Args:
+            on_record: 每成功提取一门课程的大纲时调用 on_record(record)，用于边爬边写
+
+        Returns:
+            课程记录列表（包含 school/course_id/type/name/keyword/titles）
+        """
+        metas = await self.discover_courses(keywords, max_courses, max_pages)
+        print(f"[+] 共发现 {len(metas)} 门课程，开始并发抓取大纲...")
+        return await asyncio.gather(*(self.crawl_course(meta, on_record) for meta in metas))
+
+    async def _crawl_frontier_course(self, frontier, meta, skipped):
+        try:
+            titles = await self.fetch_outline_async(meta["school"], meta["course_id"])
+        except CacheMiss:
+            # 离线模式下缓存未命中：保持待抓取状态，不计入失败次数
+            print(f"   [-] {meta['school']}-{meta['course_id']} 离线模式下缓存未命中，跳过")
+            skipped.add(meta["course_id"])
+            return
+        except Exception as e:
+            print(f"   [-] {meta['school']}-{meta['course_id']} 获取失败: {e}")
+            frontier.mark_failed(meta["course_id"], e)
+            return
+        frontier.mark_done(meta["course_id"], titles)
+        if titles:
+            print(f"[+] {meta['school']}-{meta['course_id']}: 提取到 {len(titles)} 条大纲内容")
+
+    async def crawl_frontier(self, frontier, keywords, max_pages=None, max_courses=None, retry_wait_limit=300):
+        """
+        基于 frontier 的可恢复并发爬取（见 MoocCrawler.crawl_frontier）
+        """
+        pending = frontier.unsearched_keywords(keywords)
+        results = await asyncio.gather(*(self.search_keyword_async(kw, max_courses, max_pages) for kw in pending))
+        for keyword, (metas, complete) in zip(pending, results):
+            self.record_search(frontier, keyword, metas, complete)
+
+        skipped = set()  # 本次运行中离线缓存未命中的课程
+        while True:
+            due = [meta for meta in frontier.due_courses() if meta["course_id"] not in skipped]
+            if not due:
+                wait = frontier.retry_wait(retry_wait_limit)
+                if wait is None:
+                    break
+                print(f"[*] 等待 {wait:.0f} 秒后重试失败的课程...")
+                await asyncio.sleep(wait)
+                continue
+
+            print(f"[*] 并发抓取 {len(due)} 门课程...")
+            await asyncio.gather(*(self._crawl_frontier_course(frontier, meta, skipped) for meta in due))
+
+        if skipped:
+            print(f"[*] 离线模式跳过 {len(skipped)} 门未缓存的课程，联网运行时会继续抓取")
+        print(f"[+] 爬取状态: {frontier.stats()}")
+
+
+async def crawl_async(keywords, concurrency=8, rate_per_host=5.0, max_courses=None, max_pages=None, cache=None,
+                      parser=None, on_record=None):
+    crawler = AsyncMoocCrawler(concurrency=concurrency, rate_per_host=rate_per_host, cache=cache, parser=parser)
+    try:
+        await crawler.init_session_async()
+        return await crawler.crawl(keywords, max_courses=max_courses, max_pages=max_pages, on_record=on_record)
+    finally:
+        await crawler.close()
+
+
+async def crawl_frontier_async(frontier, keywords, concurrency=8, rate_per_host=5.0, max_courses=None,
+                               max_pages=None, cache=None, parser=None, retry_wait_limit=300):
+    crawler = AsyncMoocCrawler(concurrency=concurrency, rate_per_host=rate_per_host, cache=cache, parser=parser)
+    try:
+        await crawler.init_session_async()
+        await crawler.crawl_frontier(frontier, keywords, max_pages, max_courses, retry_wait_limit)
+    finally:
+        await crawler.close()
@@ -0,0 +1,130 @@
+"""
+大纲解析基准测试：在保存的课程详情页上比较各解析后端的单页耗时
+
+页面来源（可组合）：
+    --cache-dir   ResponseCache 目录中缓存的课程详情页
+    --pages-dir   保存的 *.html 页面
+    --synthetic N 没有保存的页面时，生成 N 个模拟页面
+
+用法:
+    python bench_parse.py --cache-dir .mooc_cache
+    python bench_parse.py --synthetic 200 --repeats 5
+"""
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import random
+import argparse
+import statistics
+
+from bs4 import BeautifulSoup
+
+from outline_parser import extract_outline_html, parse_outline_titles, available_parsers
+
+
+def legacy_parse(page_text):
+    """原实现：回溯正则 + BeautifulSoup(html.parser) 全树扫描"""
+    match = re.search(r'outLine\s*:\s*"((?:\\.|[^"\\])*)"', page_text)
+    if not match:
+        return []
+    outline_html = json.loads(f'"{match.group(1)}"')
+    soup = BeautifulSoup(outline_html, 'html.parser')
+    titles = [span.get_text(strip=True) for span in soup.find_all('span')
+              if 'font-size: 16px' in span.get('style', '')]
+    if not titles:
+        for p in soup.find_all('p'):
+            text = p.get_text(strip=True)
+            if text and len(text) > 2:
+                titles.append(text)
+    return titles
+
+
+def new_parse(page_text, parser):
+    outline_html = extract_outline_html(page_text)
+    if outline_html is None:
+        return []
+    return parse_outline_titles(outline_html, parser)[0]
+
+
+def load_cached_pages(cache_dir):
+    pages = []
+    for path in glob.glob(os.path.join(cache_dir, "course", "*", "*.json.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            pages.append(json.load(f)["body"])
+    return pages
+
+
+def load_html_pages(pages_dir):
+    pages = []
+    for path in glob.glob(os.path.join(pages_dir, "*.html")):
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def synthetic_page(rng, num_chapters=12):
+    """生成结构与真实课程页相近的模拟页面（大段无关脚本 + 一个 outLine 字段）"""
+    parts = []
+    for i in range(num_chapters):
+        parts.append(f'<p><span style="font-size: 16px; font-family: 宋体">第{i + 1}章 课程内容{rng.randrange(1000)}</span></p>')
+        for j in range(rng.randrange(2, 6)):
+            parts.append(f'<p style="text-indent: 2em">{i + 1}.{j + 1} 小节 "知识点" {rng.random():.6f}</p>')
+    outline = json.dumps("".join(parts), ensure_ascii=False)
+    filler = "".join(f'var v{i} = "{"x" * rng.randrange(50, 200)}";\n' for i in range(400))
+    return f"<html><head><script>{filler}window.courseDto = {{id: 1, outLine : {outline}, spoc: false}};</script></head><body></body></html>"
+
+
+def time_parser(pages, fn, repeats):
+    per_page = []
+    for page in pages:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(page)
+            best = min(best, time.perf_counter() - start)
+        per_page.append(best * 1000)
+    return per_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大纲解析基准测试")
+    parser.add_argument("--cache-dir", help="ResponseCache 目录")
+    parser.add_argument("--pages-dir", help="保存的 *.html 页面目录")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成的模拟页面数")
+    parser.add_argument("--repeats", type=int, default=3, help="每页重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    pages = []
+    if args.cache_dir:
+        pages += load_cached_pages(args.cache_dir)
+    if args.pages_dir:
+        pages += load_html_pages(args.pages_dir)
+    if args.synthetic or not pages:
+        rng = random.Random(0)
+        pages += [synthetic_page(rng) for _ in range(args.synthetic or 100)]
+
+    print(f"[*] {len(pages)} 个页面，平均 {sum(map(len, pages)) / len(pages) / 1024:.1f} KB")
+
+    baseline_titles = [legacy_parse(page) for page in pages]
+    baseline = time_parser(pages, legacy_parse, args.repeats)
+    baseline_mean = statistics.mean(baseline)
+
+    print(f"{'parser':<12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'speedup':>8} {'agree':>9}")
+
+    def report(name, per_page, agree):
+        p95 = sorted(per_page)[int(0.95 * (len(per_page) - 1))]
+        print(f"{name:<12} {statistics.mean(per_page):>9.3f} {statistics.median(per_page):>9.3f} "
+              f"{p95:>9.3f} {baseline_mean / statistics.mean(per_page):>7.1f}x {agree:>4}/{len(pages)}")
+
+    report("legacy", baseline, len(pages))
+    for name in available_parsers():
+        fn = lambda page, name=name: new_parse(page, name)
+        agree = sum(fn(page) == expected for page, expected in zip(pages, baseline_titles))
+        report(name, time_parser(pages, fn, args.repeats), agree)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+
+# 各类接口的默认缓存有效期（秒）：搜索结果变化快，课程详情页基本不变
+DEFAULT_TTLS = {
+    "search": 6 * 3600,
+    "course": 30 * 86400,
+}
+
+
+class CacheMiss(Exception):
+    """离线模式下缓存中没有对应的响应"""
+
+
+class ResponseCache:
+    """
+    HTTP 响应的磁盘缓存
+
+    以 (url, payload) 的哈希为键，每条响应单独存为一个 gzip 压缩的 JSON 文件：
+        {cache_dir}/{endpoint}/{key[:2]}/{key}.json.gz
+    不同 endpoint 使用不同的 TTL；离线模式下忽略 TTL，只从缓存读取。
+    """
+
+    def __init__(self, cache_dir=".mooc_cache", ttls=None, offline=False):
+        self.cache_dir = cache_dir
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, url, payload=None):
+        raw = json.dumps([url, payload], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, endpoint, key):
+        return os.path.join(self.cache_dir, endpoint, key[:2], f"{key}.json.gz")
+
+    def get(self, endpoint, url, payload=None):
+        """读取缓存的响应文本，不存在或已过期时返回 None"""
+        path = self._path(endpoint, self.key(url, payload))
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        ttl = self.ttls.get(endpoint)
+        if not self.offline and ttl is not None and time.time() - entry["fetched_at"] > ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry["body"]
+
+    def set(self, endpoint, url, payload, body):
+        """写入一条响应（先写临时文件再原子替换，避免并发读到半个文件）"""
+        path = self._path(endpoint, self.key(url, payload))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {"url": url, "payload": payload, "fetched_at": time.time(), "body": body}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0.0
+        return f"缓存命中 {self.hits}/{total} ({ratio:.0%})"
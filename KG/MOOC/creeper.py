@@ -1,66 +1,210 @@
 import requests
-import re
 import json
+import math
 import sys
-from bs4 import BeautifulSoup
+import time
+import argparse
+from outline_parser import extract_outline_html, parse_outline_titles, available_parsers
+from cache import ResponseCache, CacheMiss, DEFAULT_TTLS
+from frontier import CrawlFrontier
+from outline_store import OutlineStore
+
+BASE_URL = "https://www.icourse163.org"
+SEARCH_URL = f"{BASE_URL}/web/j/mocSearchBean.searchCourse.rpc"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
 class MoocCrawler:
-    def __init__(self):
+    def __init__(self, cache=None, parser=None):
         self.session = requests.Session()
         self.csrf = None
         self.headers = None
+        self.cache = cache
+        self.parser = parser
+
+    @property
+    def offline(self):
+        return self.cache is not None and self.cache.offline
 
     def init_session(self):
         """初始化会话并获取 CSRF Token"""
+        if self.offline:
+            self.headers = self.build_headers(None)
+            print(f"[+] 离线模式：只从缓存读取 ({self.cache.cache_dir})")
+            return
+
         try:
-            self.session.get("https://www.icourse163.org")
+            self.session.get(BASE_URL)
             self.csrf = self.session.cookies.get("NTESSTUDYSI")
             
             if not self.csrf:
                 raise Exception("未能获取 csrf token (NTESSTUDYSI)")
             
-            self.headers = {
-                "edu-script-token": self.csrf,
-                "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
+            self.headers = self.build_headers(self.csrf)
             print(f"[+] 会话初始化成功")
         except Exception as e:
             print(f"[-] 初始化失败: {e}")
             sys.exit(1)
 
+    def build_headers(self, csrf):
+        return {
+            "edu-script-token": csrf,
+            "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
+            "User-Agent": USER_AGENT
+        }
+
+    def _cached(self, endpoint, url, payload, fetch):
+        """先查缓存，未命中时调用 fetch() 获取响应文本并写入缓存"""
+        if self.cache is not None:
+            body = self.cache.get(endpoint, url, payload)
+            if body is not None:
+                return body
+            if self.cache.offline:
+                raise CacheMiss(f"离线模式下缓存未命中: {url}")
+
+        body = fetch()
+        if self.cache is not None:
+            self.cache.set(endpoint, url, payload, body)
+        return body
+
+    def _search_page_text(self, keyword, page_index=1, page_size=20):
+        """请求一页搜索结果（缓存键不含每次会话都会变化的 csrfKey）"""
+        form = self.search_form(keyword, page_index, page_size)
+
+        def fetch():
+            resp = self.session.post(f"{SEARCH_URL}?csrfKey={self.csrf}", headers=self.headers, data=form)
+            resp.raise_for_status()
+            return resp.text
+
+        return self._cached("search", SEARCH_URL, form, fetch)
+
+    def _course_page_text(self, school_short, course_id):
+        """请求课程详情页"""
+        url = self.course_url(school_short, course_id)
+
+        def fetch():
+            resp = self.session.get(url, headers=self.headers, timeout=10)
+            resp.raise_for_status()
+            return resp.text
+
+        return self._cached("course", url, None, fetch)
+
     def search_course(self, keyword="人工智能"):
         """搜索课程并返回结果列表"""
-        url = f"https://www.icourse163.org/web/j/mocSearchBean.searchCourse.rpc?csrfKey={self.csrf}"
-        
+        try:
+            result = json.loads(self._search_page_text(keyword))
+            return self.parse_search_result(result)
+            
+        except Exception as e:
+            print(f"[-] 搜索出错: {e}")
+            return []
+
+    def search_form(self, keyword, page_index=1, page_size=20):
+        """构造搜索接口的表单数据"""
         payload_dict = {
             "keyword": keyword,
-            "pageIndex": 1,
+            "pageIndex": page_index,
             "highlight": True,
             "orderBy": 0,
             "stats": 30,
-            "pageSize": 20
+            "pageSize": page_size
         }
+        return {"mocCourseQueryVo": json.dumps(payload_dict)}
+
+    def parse_search_page(self, result, page_size=20):
+        """解析单页搜索结果，返回 (课程列表, 总页数)"""
+        data = result.get('result') or {}
+        courses = data.get('list') or []
         
-        try:
-            resp = self.session.post(url, headers=self.headers, data={"mocCourseQueryVo": json.dumps(payload_dict)})
-            result = resp.json()
-            courses = result.get('result', {}).get('list', [])
-            if not courses:
-                print("[-] 未找到相关课程")
-                return []
-            
-            print(f"[+] 搜索成功，找到 {len(courses)} 门课程")
-            
-            # 排序：将 type=306 的课程排在前面，优先尝试
-            # key logic: False (0) comes before True (1), so we check if type != 306
-            courses.sort(key=lambda x: x.get('type') != 306)
+        query = data.get('query') or {}
+        total_pages = query.get('totlePageCount')
+        if total_pages is None:
+            total_count = query.get('totleCount') or len(courses)
+            total_pages = math.ceil(total_count / page_size) if total_count else 1
+        
+        return courses, max(int(total_pages), 1)
+
+    def iter_search_pages(self, keyword, page_size=20, max_pages=None):
+        """
+        逐页搜索关键词，每次产出一页课程列表，直到最后一页
+        
+        某页出错时停止翻页，生成器返回 False（正常结束返回 True）
+        """
+        page_index = 1
+        total_pages = 1
+        
+        while page_index <= total_pages:
+            try:
+                result = json.loads(self._search_page_text(keyword, page_index, page_size))
+                courses, total_pages = self.parse_search_page(result, page_size)
+            except Exception as e:
+                print(f"[-] 搜索出错 ({keyword} 第 {page_index} 页)，停止翻页: {e}")
+                return False
             
-            return courses
+            if max_pages:
+                total_pages = min(total_pages, max_pages)
+            if not courses:
+                return True
             
-        except Exception as e:
-            print(f"[-] 搜索出错: {e}")
+            print(f"[+] {keyword}: 第 {page_index}/{total_pages} 页，{len(courses)} 门课程")
+            yield courses
+            page_index += 1
+        return True
+
+    def search_all_pages(self, keyword, page_size=20, max_pages=None):
+        """
+        获取关键词的全部搜索结果页
+        
+        Returns:
+            (课程列表, complete)；中途有页面出错时 complete 为 False
+        """
+        pages = self.iter_search_pages(keyword, page_size, max_pages)
+        courses = []
+        while True:
+            try:
+                courses.extend(next(pages))
+            except StopIteration as stop:
+                return courses, bool(stop.value)
+
+    def keyword_metas(self, keyword, courses, max_courses=None):
+        """将一个关键词的搜索结果转为课程元数据，去掉无法识别ID的课程"""
+        metas = [self.course_metadata(course, keyword) for course in courses]
+        metas = [meta for meta in metas if meta["course_id"]]
+        return metas[:max_courses] if max_courses else metas
+
+    def search_courses_batch(self, keywords, page_size=20, max_pages=None):
+        """
+        批量搜索多个关键词的全部结果页，按课程ID去重
+        
+        Returns:
+            课程元数据列表（见 course_metadata），保留每门课程第一次出现时的关键词
+        """
+        metas = []
+        seen = set()
+        for keyword in keywords:
+            for courses in self.iter_search_pages(keyword, page_size, max_pages):
+                for course in courses:
+                    meta = self.course_metadata(course, keyword)
+                    if not meta["course_id"] or meta["course_id"] in seen:
+                        continue
+                    seen.add(meta["course_id"])
+                    metas.append(meta)
+        print(f"[+] {len(keywords)} 个关键词共发现 {len(metas)} 门不重复的课程")
+        return metas
+
+    def parse_search_result(self, result):
+        """解析搜索接口返回的 JSON，返回排序后的课程列表"""
+        courses = result.get('result', {}).get('list', [])
+        if not courses:
+            print("[-] 未找到相关课程")
             return []
+        
+        print(f"[+] 搜索成功，找到 {len(courses)} 门课程")
+        
+        # 排序：将 type=306 的课程排在前面，优先尝试
+        # key logic: False (0) comes before True (1), so we check if type != 306
+        courses.sort(key=lambda x: x.get('type') != 306)
+        
+        return courses
 
     def _extract_school_panel(self, course_data):
         """提取学校信息的辅助逻辑"""
@@ -88,48 +232,109 @@ class MoocCrawler:
         except (KeyError, TypeError):
             return None, None
 
+    def course_metadata(self, course, keyword=None):
+        """课程元数据：学校、课程ID、类型、名称以及搜索关键词"""
+        school_short, course_id = self.extract_course_identifiers(course)
+        dto = course.get('mocCourseCard', {}).get('mocCourseCardDto', {}) or {}
+        return {
+            "school": school_short,
+            "course_id": course_id,
+            "type": course.get('type'),
+            "name": dto.get('name'),
+            "keyword": keyword,
+        }
+
+    def course_url(self, school_short, course_id):
+        return f"{BASE_URL}/course/{school_short}-{course_id}?from=searchPage&outVendor=zw_mooc_pcssjg_"
+
+    def fetch_outline(self, school_short, course_id):
+        """获取详情页并解析大纲；请求出错时直接抛出异常，页面中没有大纲时返回空列表"""
+        return self.parse_outline(self._course_page_text(school_short, course_id))
+
     def fetch_and_parse_outline(self, school_short, course_id):
         """获取详情页并解析大纲"""
-        url = f"https://www.icourse163.org/course/{school_short}-{course_id}?from=searchPage&outVendor=zw_mooc_pcssjg_"
-        
         try:
             print(f"[*] 正在尝试获取: {school_short}-{course_id}")
-            resp = self.session.get(url, headers=self.headers, timeout=10)
-            
-            pattern = r'outLine\s*:\s*"((?:\\.|[^"\\])*)"'
-            match = re.search(pattern, resp.text)
-            
-            if not match:
-                print("   [-] 页面中未找到 outLine 数据")
-                return []
-
-            raw_js_string = match.group(1)
-            outline_html = json.loads(f'"{raw_js_string}"')
-            
-            soup = BeautifulSoup(outline_html, 'html.parser')
-            titles = []
-            
-            # 提取 font-size: 16px 的内容
-            for span in soup.find_all('span'):
-                style = span.get('style', '')
-                if 'font-size: 16px' in style:
-                    titles.append(span.get_text(strip=True))
-            
-            # 如果没提取到 16px 的，尝试提取所有 <p> 标签作为备选（防止某些课程样式不同）
-            if not titles:
-                print("   [!] 未找到标准标题格式(16px)，尝试提取普通段落...")
-                for p in soup.find_all('p'):
-                    text = p.get_text(strip=True)
-                    # 简单过滤太短的或者看起来像小节的
-                    if text and len(text) > 2: 
-                        titles.append(text)
-            
-            return titles
+            return self.fetch_outline(school_short, course_id)
 
         except Exception as e:
             print(f"   [-] 解析过程出错: {e}")
             return []
 
+    def parse_outline(self, page_text):
+        """从课程详情页 HTML 中解析大纲标题"""
+        outline_html = extract_outline_html(page_text)
+        
+        if outline_html is None:
+            print("   [-] 页面中未找到 outLine 数据")
+            return []
+
+        titles, used_paragraphs = parse_outline_titles(outline_html, self.parser)
+        
+        # 没有 16px 标题时，解析器会退而提取普通段落（防止某些课程样式不同）
+        if used_paragraphs:
+            print("   [!] 未找到标准标题格式(16px)，已提取普通段落")
+        
+        return titles
+
+    def record_search(self, frontier, keyword, metas, complete=True):
+        """
+        把一个关键词的搜索结果登记到 frontier
+        
+        没有结果或有结果页出错（complete 为 False）时不标记为已搜索，
+        下次运行重新搜索全部页面；已拿到的课程照常加入 frontier
+        """
+        if not metas:
+            print(f"[-] {keyword}: 未找到课程，下次运行将重新搜索")
+            return
+        new_courses = frontier.add_courses(metas)
+        if not complete:
+            print(f"[-] {keyword}: 部分结果页获取失败，已登记 {len(metas)} 门课程"
+                  f"（{new_courses} 门为新发现），下次运行将重新搜索")
+            return
+        frontier.mark_keyword_searched(keyword, len(metas))
+        print(f"[+] {keyword}: {len(metas)} 门课程，其中 {new_courses} 门为新发现")
+
+    def crawl_frontier(self, frontier, keywords, max_pages=None, max_courses=None, retry_wait_limit=300):
+        """
+        基于 frontier 的可恢复爬取：只搜索未搜索过的关键词，只抓取未完成的课程，
+        失败的课程按退避时间重试。离线模式下缓存未命中的课程保持待抓取状态，
+        不计入失败次数，留给联网运行
+        
+        Args:
+            frontier: CrawlFrontier
+            retry_wait_limit: 下一次重试的等待时间超过该值（秒）时结束本次运行
+        """
+        for keyword in frontier.unsearched_keywords(keywords):
+            courses, complete = self.search_all_pages(keyword, max_pages=max_pages)
+            self.record_search(frontier, keyword, self.keyword_metas(keyword, courses, max_courses), complete)
+
+        skipped = set()  # 本次运行中离线缓存未命中的课程
+        while True:
+            due = [meta for meta in frontier.due_courses() if meta["course_id"] not in skipped]
+            if not due:
+                wait = frontier.retry_wait(retry_wait_limit)
+                if wait is None:
+                    break
+                print(f"[*] 等待 {wait:.0f} 秒后重试失败的课程...")
+                time.sleep(wait)
+                continue
+
+            for meta in due:
+                try:
+                    print(f"[*] 正在获取: {meta['school']}-{meta['course_id']}")
+                    frontier.mark_done(meta["course_id"], self.fetch_outline(meta["school"], meta["course_id"]))
+                except CacheMiss:
+                    print("   [-] 离线模式下缓存未命中，跳过")
+                    skipped.add(meta["course_id"])
+                except Exception as e:
+                    print(f"   [-] 获取失败: {e}")
+                    frontier.mark_failed(meta["course_id"], e)
+
+        if skipped:
+            print(f"[*] 离线模式跳过 {len(skipped)} 门未缓存的课程，联网运行时会继续抓取")
+        print(f"[+] 爬取状态: {frontier.stats()}")
+
     def save_to_file(self, data, filename):
         try:
             with open(filename, "w", encoding="utf-8") as f:
@@ -138,11 +343,16 @@ class MoocCrawler:
         except Exception as e:
             print(f"[-] 保存文件失败: {e}")
 
-def main():
-    crawler = MoocCrawler()
+def crawl_first_outline(keyword, cache=None, parser=None, store_path=None):
+    """
+    同步模式：依次尝试搜索结果中的课程，保存第一个成功提取到的大纲
+    
+    指定 store_path 时，大纲（含元数据）写入合并的大纲存储，而不是单独的 JSON 文件
+    """
+    crawler = MoocCrawler(cache, parser)
     crawler.init_session()
     
-    courses = crawler.search_course("电工电子实践B")
+    courses = crawler.search_course(keyword)
     
     max_attempts = 5
     attempts = 0
@@ -166,8 +376,14 @@ def main():
         # 3. 验证结果
         if titles and len(titles) > 0:
             print(f"[+] 成功！共提取到 {len(titles)} 条大纲内容")
-            filename = f"{school_short}-{course_id}.json"
-            crawler.save_to_file(titles, filename)
+            if store_path:
+                with OutlineStore(store_path) as store:
+                    added = store.add(dict(crawler.course_metadata(course, keyword), titles=titles))
+                state = "已写入" if added else "已存在于"
+                print(f"[+] 大纲{state}存储 {store_path}（共 {len(store)} 门课程）")
+            else:
+                filename = f"{school_short}-{course_id}.json"
+                crawler.save_to_file(titles, filename)
             # 成功后直接退出程序
             return
         else:
@@ -175,5 +391,109 @@ def main():
     
     print("\n[-] 所有尝试均未获取到有效大纲数据。")
 
+def load_keywords(path):
+    """从文件读取关键词（每行一个，如培养方案中的课程名称）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def crawl_all_async(keywords, concurrency, rate_per_host, max_courses, max_pages=None, cache=None, parser=None,
+                    store_path=None):
+    """
+    异步模式：并发抓取所有关键词下所有课程的大纲
+    
+    指定 store_path 时，每门课程（含元数据）一完成就追加到合并的大纲存储中；
+    否则每门课程单独保存一个 {school}-{id}.json 文件
+    """
+    import asyncio
+    from async_crawler import crawl_async
+
+    if store_path:
+        with OutlineStore(store_path) as store:
+            records = asyncio.run(crawl_async(keywords, concurrency, rate_per_host, max_courses, max_pages,
+                                              cache, parser, on_record=store.add))
+        print(f"[+] 大纲存储 {store_path} 共 {len(store)} 门课程")
+    else:
+        records = asyncio.run(crawl_async(keywords, concurrency, rate_per_host, max_courses, max_pages, cache, parser))
+        saver = MoocCrawler()
+        for record in records:
+            if record["titles"]:
+                saver.save_to_file(record["titles"], f"{record['school']}-{record['course_id']}.json")
+
+    succeeded = sum(1 for record in records if record["titles"])
+    print(f"\n[+] 完成：{succeeded}/{len(records)} 门课程提取到大纲")
+
+def main():
+    parser = argparse.ArgumentParser(description="中国大学MOOC课程大纲爬虫")
+    parser.add_argument("keywords", nargs="*", help="搜索关键词（可多个，默认：电工电子实践B）")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="异步并发抓取所有课程")
+    parser.add_argument("--concurrency", type=int, default=8, help="异步模式的最大并发请求数")
+    parser.add_argument("--rate", type=float, default=5.0, help="异步模式下每个域名每秒最多请求数")
+    parser.add_argument("--max-courses", type=int, default=None, help="每个关键词最多抓取的课程数")
+    parser.add_argument("--keywords-file", help="关键词文件（每行一个），与命令行关键词合并")
+    parser.add_argument("--max-pages", type=int, default=None, help="每个关键词最多翻的搜索结果页数（默认全部）")
+    parser.add_argument("--search-only", metavar="FILE", help="只搜索全部结果页，将去重后的课程列表保存到 FILE")
+    parser.add_argument("--parser", choices=available_parsers(), default=None, help="大纲 HTML 解析后端（默认使用最快的可用后端）")
+    parser.add_argument("--cache-dir", default=".mooc_cache", help="响应缓存目录")
+    parser.add_argument("--no-cache", action="store_true", help="不使用响应缓存")
+    parser.add_argument("--offline", action="store_true", help="离线模式：只从缓存读取，不访问网络")
+    parser.add_argument("--search-ttl", type=float, default=DEFAULT_TTLS["search"], help="搜索结果缓存有效期（秒）")
+    parser.add_argument("--course-ttl", type=float, default=DEFAULT_TTLS["course"], help="课程详情页缓存有效期（秒）")
+    parser.add_argument("--frontier", metavar="DB", help="使用 SQLite 爬取前沿：可断点续爬，不重复抓取已完成的课程")
+    parser.add_argument("--retry-wait", type=float, default=300, help="失败课程的重试等待超过该秒数时结束本次运行")
+    parser.add_argument("--export", metavar="FILE", help="将 frontier 中所有已提取的大纲导出到 FILE")
+    parser.add_argument("--store", metavar="PATH", help="批量输出：所有课程大纲及元数据合并写入一个压缩 JSONL 存储（如 outlines.jsonl.gz）")
+    args = parser.parse_args()
+    if args.store and args.search_only and not args.frontier:
+        parser.error("--search-only 只保存课程列表，不抓取大纲，不能与 --store 同时使用")
+
+    cache = None
+    if not args.no_cache or args.offline:
+        cache = ResponseCache(
+            args.cache_dir,
+            ttls={"search": args.search_ttl, "course": args.course_ttl},
+            offline=args.offline
+        )
+
+    keywords = list(args.keywords)
+    if args.keywords_file:
+        keywords += load_keywords(args.keywords_file)
+    if not keywords:
+        keywords = ["电工电子实践B"]
+
+    if args.frontier:
+        frontier = CrawlFrontier(args.frontier)
+        try:
+            if args.use_async:
+                import asyncio
+                from async_crawler import crawl_frontier_async
+                asyncio.run(crawl_frontier_async(frontier, keywords, args.concurrency, args.rate, args.max_courses,
+                                                 args.max_pages, cache, args.parser, args.retry_wait))
+            else:
+                crawler = MoocCrawler(cache, args.parser)
+                crawler.init_session()
+                crawler.crawl_frontier(frontier, keywords, args.max_pages, args.max_courses, args.retry_wait)
+
+            if args.export:
+                MoocCrawler().save_to_file(list(frontier.iter_outlines()), args.export)
+            if args.store:
+                with OutlineStore(args.store) as store:
+                    added = sum(store.add(record) for record in frontier.iter_outlines())
+                print(f"[+] 大纲存储 {args.store}: 新增 {added} 门，共 {len(store)} 门课程")
+        finally:
+            frontier.close()
+    elif args.search_only:
+        crawler = MoocCrawler(cache, args.parser)
+        crawler.init_session()
+        metas = crawler.search_courses_batch(keywords, max_pages=args.max_pages)
+        crawler.save_to_file(metas, args.search_only)
+    elif args.use_async:
+        crawl_all_async(keywords, args.concurrency, args.rate, args.max_courses, args.max_pages, cache, args.parser,
+                        args.store)
+    else:
+        crawl_first_outline(keywords[0], cache, args.parser, args.store)
+
+    if cache is not None:
+        print(f"[*] {cache.stats()}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
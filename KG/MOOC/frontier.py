@@ -0,0 +1,158 @@
+import json
+import time
+import random
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (
+    keyword     TEXT PRIMARY KEY,
+    num_courses INTEGER,
+    searched_at REAL
+);
+CREATE TABLE IF NOT EXISTS courses (
+    course_id       PRIMARY KEY,
+    school          TEXT,
+    type            INTEGER,
+    name            TEXT,
+    keyword         TEXT,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    outline         TEXT,
+    updated_at      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_courses_status ON courses (status, next_attempt_at);
+"""
+
+# 课程状态
+PENDING = "pending"   # 已发现，尚未抓取
+DONE = "done"         # 已提取到大纲
+EMPTY = "empty"       # 页面正常但没有大纲，不再重试
+FAILED = "failed"     # 抓取出错，等待退避后重试
+DEAD = "dead"         # 重试次数用尽
+
+
+class CrawlFrontier:
+    """
+    基于 SQLite 的爬取前沿（frontier）
+
+    记录已搜索的关键词、发现的课程、抓取状态、尝试次数和提取到的大纲。
+    进程崩溃后重新运行会从数据库继续：已搜索的关键词不再搜索，
+    已完成的课程不再抓取，失败的课程按指数退避重试。
+    """
+
+    def __init__(self, db_path="mooc_frontier.db", max_attempts=5, base_backoff=30.0, max_backoff=3600.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # ---- 关键词 ----
+
+    def unsearched_keywords(self, keywords):
+        """返回尚未搜索过的关键词（保持原顺序）"""
+        searched = {row["keyword"] for row in self.conn.execute("SELECT keyword FROM keywords")}
+        return [kw for kw in dict.fromkeys(keywords) if kw not in searched]
+
+    def mark_keyword_searched(self, keyword, num_courses):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO keywords (keyword, num_courses, searched_at) VALUES (?, ?, ?)",
+                (keyword, num_courses, time.time())
+            )
+
+    # ---- 课程 ----
+
+    def add_courses(self, metas):
+        """登记新发现的课程，已存在的课程保持原状态；返回新增数量"""
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO courses (course_id, school, type, name, keyword, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(m["course_id"], m["school"], m["type"], m["name"], m["keyword"], now) for m in metas]
+            )
+            return self.conn.total_changes - before
+
+    def due_courses(self, limit=None):
+        """返回当前可以抓取的课程：未抓取的，以及退避时间已到的失败课程"""
+        sql = ("SELECT course_id, school, type, name, keyword FROM courses "
+               "WHERE status IN (?, ?) AND next_attempt_at <= ? ORDER BY next_attempt_at, rowid")
+        params = [PENDING, FAILED, time.time()]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def next_retry_at(self):
+        """最早一门待重试课程的重试时间，没有待重试课程时返回 None"""
+        row = self.conn.execute(
+            "SELECT MIN(next_attempt_at) AS t FROM courses WHERE status = ?", (FAILED,)
+        ).fetchone()
+        return row["t"]
+
+    def retry_wait(self, limit):
+        """
+        没有可抓取的课程时，距离下一次重试还需等待的秒数；
+        没有待重试课程或等待时间超过 limit 时返回 None（留给下次运行）
+        """
+        next_retry = self.next_retry_at()
+        if next_retry is None:
+            return None
+        wait = max(next_retry - time.time(), 0.0)
+        return wait if wait <= limit else None
+
+    def mark_done(self, course_id, titles):
+        """记录抓取结果；大纲为空时标记为 empty，不再重试"""
+        status = DONE if titles else EMPTY
+        with self.conn:
+            self.conn.execute(
+                "UPDATE courses SET status = ?, attempts = attempts + 1, outline = ?, "
+                "last_error = NULL, updated_at = ? WHERE course_id = ?",
+                (status, json.dumps(titles, ensure_ascii=False), time.time(), course_id)
+            )
+
+    def mark_failed(self, course_id, error):
+        """记录一次失败，按指数退避（带抖动）安排下一次重试"""
+        row = self.conn.execute("SELECT attempts FROM courses WHERE course_id = ?", (course_id,)).fetchone()
+        attempts = (row["attempts"] if row else 0) + 1
+
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = DEAD, 0
+        else:
+            delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+            status, next_attempt_at = FAILED, time.time() + delay * random.uniform(0.8, 1.2)
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE courses SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "updated_at = ? WHERE course_id = ?",
+                (status, attempts, next_attempt_at, str(error)[:500], time.time(), course_id)
+            )
+
+    def iter_outlines(self):
+        """按发现顺序遍历所有已提取到大纲的课程"""
+        rows = self.conn.execute(
+            "SELECT course_id, school, type, name, keyword, outline FROM courses WHERE status = ? ORDER BY rowid",
+            (DONE,)
+        )
+        for row in rows:
+            record = dict(row)
+            record["titles"] = json.loads(record.pop("outline"))
+            yield record
+
+    def stats(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM courses GROUP BY status").fetchall())
+        num_keywords = self.conn.execute("SELECT COUNT(*) FROM keywords").fetchone()[0]
+        return {"keywords": num_keywords, **{s: counts.get(s, 0) for s in (PENDING, DONE, EMPTY, FAILED, DEAD)}}
@@ -0,0 +1,117 @@
+import re
+import json
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# outLine:"..." 中的 JS 字符串；展开循环写法 ("[^"\\]*(?:\\.[^"\\]*)*")，不会回溯
+OUTLINE_RE = re.compile(r'outLine\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+TITLE_STYLE = "font-size: 16px"
+
+
+def extract_outline_html(page_text):
+    """从课程详情页中取出 outLine 字段并解码为 HTML，找不到时返回 None"""
+    # 先用 str.find 定位，只对附近的一小段做正则匹配
+    start = page_text.find("outLine")
+    if start < 0:
+        return None
+    match = OUTLINE_RE.search(page_text, start)
+    if not match:
+        return None
+    return json.loads(f'"{match.group(1)}"')
+
+
+def _titles_selectolax(outline_html):
+    tree = HTMLParser(outline_html)
+    titles = [node.text(deep=True, separator="", strip=True)
+              for node in tree.css(f'span[style*="{TITLE_STYLE}"]')]
+    if titles:
+        return titles, False
+    paragraphs = (node.text(deep=True, separator="", strip=True) for node in tree.css("p"))
+    return [text for text in paragraphs if len(text) > 2], True
+
+
+def _lxml_text(element):
+    return "".join(text.strip() for text in element.itertext())
+
+
+def _titles_lxml(outline_html):
+    root = lxml.html.fragment_fromstring(outline_html, create_parent="div")
+    titles = [_lxml_text(span) for span in root.xpath(f'.//span[contains(@style, "{TITLE_STYLE}")]')]
+    if titles:
+        return titles, False
+    paragraphs = (_lxml_text(p) for p in root.iter("p"))
+    return [text for text in paragraphs if len(text) > 2], True
+
+
+def _titles_bs4(outline_html):
+    soup = BeautifulSoup(outline_html, "html.parser")
+    titles = []
+
+    # 提取 font-size: 16px 的内容
+    for span in soup.find_all("span"):
+        style = span.get("style", "")
+        if TITLE_STYLE in style:
+            titles.append(span.get_text(strip=True))
+    if titles:
+        return titles, False
+
+    # 如果没提取到 16px 的，提取所有 <p> 标签作为备选（防止某些课程样式不同）
+    for p in soup.find_all("p"):
+        text = p.get_text(strip=True)
+        # 简单过滤太短的或者看起来像小节的
+        if text and len(text) > 2:
+            titles.append(text)
+    return titles, True
+
+
+PARSERS = {
+    "selectolax": _titles_selectolax,
+    "lxml": _titles_lxml,
+    "bs4": _titles_bs4,
+}
+
+
+def available_parsers():
+    """按速度从快到慢列出当前环境可用的解析后端"""
+    names = []
+    if HTMLParser is not None:
+        names.append("selectolax")
+    if lxml is not None:
+        names.append("lxml")
+    names.append("bs4")
+    return names
+
+
+DEFAULT_PARSER = available_parsers()[0]
+
+
+def parse_outline_titles(outline_html, parser=None):
+    """
+    解析大纲 HTML 中的标题
+
+    Returns:
+        (titles, used_paragraphs)：used_paragraphs 为 True 表示没有找到 16px 标题，
+        退而使用普通段落
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser != "bs4":
+        try:
+            return PARSERS[parser](outline_html)
+        except Exception:
+            # 快速解析失败时回退到 BeautifulSoup
+            pass
+    return _titles_bs4(outline_html)
@@ -0,0 +1,156 @@
+import os
+import gzip
+import json
+import zlib
+
+
+class OutlineStore:
+    """
+    所有课程大纲合并存储在一个 gzip 压缩的 JSONL 文件中
+
+    每批记录写成一个独立的 gzip member 追加到文件末尾（多个 member 拼接仍是合法的
+    gzip 文件），因此：
+      - 下游加载只需一次顺序读取：gzip.open(path, "rt") 逐行即可
+      - 按课程ID随机读取时，通过索引文件定位所在 member，只解压这一小段
+
+    索引文件 {path}.idx 每行一条：course_id \\t member偏移 \\t member长度。
+    数据文件比索引新（如写完数据后进程崩溃）时，打开时会扫描未索引的尾部补齐索引。
+    """
+
+    def __init__(self, path="outlines.jsonl.gz", batch_size=100):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.batch_size = batch_size
+        self.index = {}
+        self._buffer = []
+        self._load_index()
+
+    # ---- 索引 ----
+
+    def _load_index(self):
+        indexed_end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 3:
+                        continue  # 崩溃时写了一半的行
+                    course_id, offset, length = parts[0], int(parts[1]), int(parts[2])
+                    self.index[course_id] = (offset, length)
+                    indexed_end = max(indexed_end, offset + length)
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > indexed_end:
+            self._reindex_tail(indexed_end)
+
+    def _reindex_tail(self, start):
+        """扫描 start 之后未进入索引的 gzip member；末尾不完整的 member 直接截掉"""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+
+        pos = 0
+        entries = []
+        while pos < len(data):
+            decomp = zlib.decompressobj(wbits=31)
+            try:
+                text = decomp.decompress(data[pos:])
+            except zlib.error:
+                break
+            if not decomp.eof:
+                break
+            length = len(data) - pos - len(decomp.unused_data)
+            for line in text.decode("utf-8").splitlines():
+                course_id = str(json.loads(line)["course_id"])
+                entries.append((course_id, start + pos, length))
+            pos += length
+
+        if pos < len(data):
+            print(f"[!] 截掉 {self.path} 末尾 {len(data) - pos} 字节不完整的数据")
+            with open(self.path, "r+b") as f:
+                f.truncate(start + pos)
+
+        self._append_index(entries)
+
+    def _append_index(self, entries):
+        if not entries:
+            return
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for course_id, offset, length in entries:
+                f.write(f"{course_id}\t{offset}\t{length}\n")
+                self.index[course_id] = (offset, length)
+
+    # ---- 写入 ----
+
+    def __contains__(self, course_id):
+        key = str(course_id)
+        return key in self.index or any(str(r["course_id"]) == key for r in self._buffer)
+
+    def __len__(self):
+        return len(self.index) + len(self._buffer)
+
+    def add(self, record):
+        """
+        追加一门课程的记录（course_id/school/type/name/keyword/titles）；
+        已存在的课程ID会被忽略。返回是否实际写入。
+        """
+        if record["course_id"] in self:
+            return False
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """把缓冲的记录写成一个 gzip member 并更新索引"""
+        if not self._buffer:
+            return
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self._buffer)
+        member = gzip.compress(lines.encode("utf-8"))
+
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._append_index([(str(r["course_id"]), offset, len(member)) for r in self._buffer])
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ---- 读取 ----
+
+    def get(self, course_id):
+        """按课程ID读取一条记录，不存在时返回 None"""
+        key = str(course_id)
+        if key not in self.index:
+            for record in self._buffer:
+                if str(record["course_id"]) == key:
+                    return record
+            return None
+
+        offset, length = self.index[key]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        for line in gzip.decompress(member).decode("utf-8").splitlines():
+            record = json.loads(line)
+            if str(record["course_id"]) == key:
+                return record
+        return None
+
+    def iter_records(self):
+        """顺序读取所有记录（一次顺序读，适合下游批量加载）"""
+        self.flush()
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
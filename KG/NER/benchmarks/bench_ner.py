@@ -0,0 +1,357 @@
+"""
+NER 延迟/吞吐量基准测试
+
+在 batch_size x seq_len x threads 网格上测量 CourseNER（端到端，含编码和实体解析）
+与 BertBiLSTMCRF（仅前向 + CRF解码）的 p50/p95/p99 延迟和每秒句子数，
+覆盖所有可用后端：eager / compiled / quantized / onnx。
+
+默认使用随机初始化的小型 BERT 配置，无需下载 hfl-chinese-roberta-wwm-ext 权重。
+
+用法:
+    python benchmarks/bench_ner.py --output benchmarks/results/baseline.json
+    python benchmarks/bench_ner.py --compare old.json new.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from transformers import BertConfig as BertModelConfig
+from config import Config
+from model import BertBiLSTMCRF
+from encoder import CharEncoder
+from predict import CourseNER
+
+BACKENDS = ['eager', 'compiled', 'quantized', 'onnx']
+TARGETS = ['course_ner', 'model']
+
+# 随机初始化的小型 BERT 配置
+SMALL_BERT = {
+    'hidden_size': 128,
+    'num_hidden_layers': 2,
+    'num_attention_heads': 2,
+    'intermediate_size': 512,
+    'max_position_embeddings': 512,
+}
+# 小词表：特殊符号 + 前 N 个 CJK 统一汉字
+NUM_VOCAB_CHARS = 6000
+
+
+def build_offline_model(work_dir: Path, config: Config, pretrained: Optional[str] = None) -> str:
+    """
+    准备模型目录（tokenizer词表 + BERT配置）和随机初始化的checkpoint
+
+    Args:
+        work_dir: 临时目录
+        config: 配置对象（pretrained_model 会被改为指向 work_dir）
+        pretrained: 如果给出，使用该目录的真实词表和BERT配置（权重仍随机初始化）
+
+    Returns:
+        checkpoint路径
+    """
+    torch.manual_seed(config.seed)
+
+    if pretrained:
+        config.pretrained_model = pretrained
+        bert_config = BertModelConfig.from_pretrained(pretrained)
+    else:
+        vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+        vocab += [chr(0x4E00 + i) for i in range(NUM_VOCAB_CHARS)]
+        (work_dir / 'vocab.txt').write_text('\n'.join(vocab), encoding='utf-8')
+
+        bert_config = BertModelConfig(vocab_size=len(vocab), **SMALL_BERT)
+        bert_config.save_pretrained(str(work_dir))
+        config.pretrained_model = str(work_dir)
+
+    model = BertBiLSTMCRF(
+        config=bert_config,
+        num_tags=config.num_tags,
+        hidden_dim=config.hidden_dim,
+        num_layers=config.num_layers,
+        dropout=config.dropout
+    )
+    model_path = work_dir / 'random_model.pth'
+    torch.save({'model_state_dict': model.state_dict(), 'best_f1': None}, model_path)
+    return str(model_path)
+
+
+class OnnxBertBiLSTMCRF:
+    """ONNX Runtime 计算发射分数，CRF 解码仍用 PyTorch（与 BertBiLSTMCRF 调用方式一致）"""
+
+    def __init__(self, model: BertBiLSTMCRF, onnx_path: Path, num_threads: int):
+        import onnxruntime as ort
+
+        self.crf = model.crf
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_ids, attention_mask=None, token_type_ids=None):
+        emissions = self.session.run(['emissions'], {
+            'input_ids': input_ids.cpu().numpy(),
+            'attention_mask': attention_mask.cpu().numpy(),
+            'token_type_ids': token_type_ids.cpu().numpy(),
+        })[0]
+        return self.crf.decode(torch.from_numpy(emissions), mask=attention_mask.bool())
+
+
+class _EmissionsModule(nn.Module):
+    """导出ONNX用：只包含 get_emissions 部分"""
+
+    def __init__(self, model: BertBiLSTMCRF):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model.get_emissions(input_ids, attention_mask, token_type_ids)
+
+
+def export_onnx(model: BertBiLSTMCRF, onnx_path: Path) -> None:
+    dummy = torch.ones((2, 16), dtype=torch.long)
+    torch.onnx.export(
+        _EmissionsModule(model),
+        (dummy, dummy, torch.zeros_like(dummy)),
+        str(onnx_path),
+        input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+        output_names=['emissions'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'seq'},
+            'attention_mask': {0: 'batch', 1: 'seq'},
+            'token_type_ids': {0: 'batch', 1: 'seq'},
+            'emissions': {0: 'batch', 1: 'seq'},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+def make_backend(name: str, model: BertBiLSTMCRF, work_dir: Path, num_threads: int) -> Callable:
+    """
+    构造指定后端的可调用对象，签名与 BertBiLSTMCRF 推理时一致
+
+    Raises:
+        RuntimeError: 后端在当前环境不可用
+    """
+    if name == 'eager':
+        return model
+    if name == 'compiled':
+        if not hasattr(torch, 'compile'):
+            raise RuntimeError('torch.compile requires PyTorch >= 2.0')
+        return torch.compile(model)
+    if name == 'quantized':
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear, nn.LSTM}, dtype=torch.qint8)
+    if name == 'onnx':
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            raise RuntimeError('onnxruntime is not installed')
+        onnx_path = work_dir / 'emissions.onnx'
+        if not onnx_path.exists():
+            export_onnx(model, onnx_path)
+        return OnnxBertBiLSTMCRF(model, onnx_path, num_threads)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def random_texts(num: int, length: int, rng: random.Random) -> List[str]:
+    """生成随机中文字符串（全部落在小词表内）"""
+    return [
+        "".join(chr(0x4E00 + rng.randrange(NUM_VOCAB_CHARS)) for _ in range(length))
+        for _ in range(num)
+    ]
+
+
+def time_fn(fn: Callable[[], Any], warmup: int, repeats: int) -> List[float]:
+    """重复执行 fn，返回每次的耗时（秒）"""
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn()
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies: List[float], batch_size: int) -> Dict[str, float]:
+    lat_ms = np.array(latencies) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(lat_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(lat_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(lat_ms, 99)), 3),
+        'mean_ms': round(float(lat_ms.mean()), 3),
+        'sentences_per_sec': round(batch_size * len(latencies) / float(np.sum(latencies)), 2),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    config = Config()
+    config.device = 'cpu'
+    rng = random.Random(config.seed)
+
+    results = []
+    skipped = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        model_path = build_offline_model(work_dir, config, args.pretrained)
+        ner = CourseNER(model_path, config)
+        eager_model = ner.model
+
+        for backend_name in args.backends:
+            for num_threads in args.threads:
+                torch.set_num_threads(num_threads)
+                try:
+                    backend = make_backend(backend_name, eager_model, work_dir, num_threads)
+                except Exception as e:
+                    skipped[backend_name] = f"{type(e).__name__}: {e}"
+                    print(f"[-] Skipping backend {backend_name}: {skipped[backend_name]}")
+                    break
+
+                for seq_len in args.seq_lens:
+                    for batch_size in args.batch_sizes:
+                        texts = random_texts(batch_size, seq_len - 2, rng)
+                        encoder = CharEncoder(ner.tokenizer, seq_len)
+                        encoded = encoder.encode_batch(texts)
+                        inputs = {k: torch.from_numpy(encoded[k])
+                                  for k in ('input_ids', 'attention_mask', 'token_type_ids')}
+
+                        for target in args.targets:
+                            if target == 'model':
+                                fn = lambda: backend(**inputs)
+                            else:
+                                ner.model = backend
+                                ner.encoder = encoder
+                                fn = lambda: ner.predict_batch(texts, batch_size=batch_size)
+
+                            try:
+                                latencies = time_fn(fn, args.warmup, args.repeats)
+                            except Exception as e:
+                                skipped[backend_name] = f"{type(e).__name__}: {e}"
+                                print(f"[-] Backend {backend_name} failed: {skipped[backend_name]}")
+                                continue
+                            finally:
+                                ner.model = eager_model
+
+                            record = {
+                                'target': target,
+                                'backend': backend_name,
+                                'batch_size': batch_size,
+                                'seq_len': seq_len,
+                                'threads': num_threads,
+                                **summarize(latencies, batch_size),
+                            }
+                            results.append(record)
+                            print(f"  {target:<10} {backend_name:<9} bs={batch_size:<3} len={seq_len:<4} "
+                                  f"threads={num_threads:<2} p50={record['p50_ms']:.2f}ms "
+                                  f"p99={record['p99_ms']:.2f}ms {record['sentences_per_sec']:.1f} sent/s")
+
+        bert_config = eager_model.config.to_dict()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'torch': torch.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'model': {
+                'pretrained': args.pretrained or 'random-small',
+                'hidden_size': bert_config['hidden_size'],
+                'num_hidden_layers': bert_config['num_hidden_layers'],
+                'vocab_size': bert_config['vocab_size'],
+                'lstm_hidden_dim': config.hidden_dim,
+                'lstm_num_layers': config.num_layers,
+            },
+            'warmup': args.warmup,
+            'repeats': args.repeats,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(old_file: str, new_file: str) -> None:
+    """对比两次基准测试结果的 p50 延迟和吞吐量"""
+    with open(old_file, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def key(r):
+        return (r['target'], r['backend'], r['batch_size'], r['seq_len'], r['threads'])
+
+    old_results = {key(r): r for r in old['results']}
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for r in new['results']:
+        base = old_results.get(key(r))
+        if base is None:
+            continue
+        p50_change = (r['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100
+        tput_change = (r['sentences_per_sec'] - base['sentences_per_sec']) / base['sentences_per_sec'] * 100
+        target, backend, batch_size, seq_len, threads = key(r)
+        print(f"  {target:<10} {backend:<9} bs={batch_size:<3} len={seq_len:<4} threads={threads:<2} "
+              f"p50 {base['p50_ms']:.2f} -> {r['p50_ms']:.2f}ms ({p50_change:+.1f}%)  "
+              f"throughput {tput_change:+.1f}%")
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NER latency/throughput benchmark")
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='逗号分隔的后端列表')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='course_ner, model')
+    parser.add_argument('--batch-sizes', type=parse_int_list, default=[1, 8, 32])
+    parser.add_argument('--seq-lens', type=parse_int_list, default=[32, 128])
+    parser.add_argument('--threads', type=parse_int_list, default=[1, torch.get_num_threads()])
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--pretrained', help='使用真实的词表和BERT配置（权重仍随机初始化）')
+    parser.add_argument('--output', default=str(Path(__file__).parent / 'results' / 'latest.json'))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='对比两个结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.backends = [b for b in args.backends.split(',') if b]
+    args.targets = [t for t in args.targets.split(',') if t]
+    args.threads = sorted(set(args.threads))
+
+    report = run_benchmarks(args)
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"\nSaved {len(report['results'])} results to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
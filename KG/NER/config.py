@@ -72,6 +72,12 @@ class Config:
     # 设备
     device = 'cpu'  # 如果没有GPU，改为 'cpu'
     
+    # 推理池（CPU多副本）
+    num_replicas = 1             # 副本进程数，1表示不启用推理池
+    threads_per_replica = None   # 每个副本的线程数，None表示平均分配可用CPU核
+    pool_chunk_size = 8          # 每个请求块包含的文本数
+    latency_target_ms = 200      # 自动调优时单个请求块的p95端到端延迟目标（含排队）
+    
     # 其他
     seed = 42
     save_steps = 100  # 每多少步保存一次模型
@@ -6,6 +6,7 @@ from torch.utils.data import Dataset
 from transformers import BertTokenizer
 from typing import List, Tuple
 from config import Config
+from encoder import CharEncoder
 
 
 class NERDataset(Dataset):
@@ -26,6 +27,15 @@ class NERDataset(Dataset):
         # 加载数据
         self.sentences, self.tags = self._load_data(file_path)
         
+        # 字符级编码（与推理共用同一个编码器，保证完全一致）
+        self.encoder = CharEncoder(tokenizer, self.max_seq_length)
+        encoded = self.encoder.encode_batch(self.sentences)
+        self.input_ids = encoded['input_ids']
+        self.attention_mask = encoded['attention_mask']
+        self.token_type_ids = encoded['token_type_ids']
+        self.seq_len = encoded['seq_len']
+        self.labels = self.encoder.encode_labels(self.tags, self.tag2id)
+        
     def _load_data(self, file_path: str) -> Tuple[List[List[str]], List[List[str]]]:
         """
         从BIO格式文件加载数据
@@ -79,67 +89,15 @@ class NERDataset(Dataset):
             attention_mask: attention mask
             token_type_ids: token type ids (segment ids)
             labels: 标签序列
-            seq_len: 实际序列长度（不包括[CLS]和[SEP]）
+            seq_len: 实际序列长度（包括[CLS]和[SEP]）
         """
-        chars = self.sentences[idx]
-        tags = self.tags[idx]
-        
-        # 将字符转为token（BERT会进行wordpiece分词）
-        # 使用is_split_into_words=True表示输入已经是分好的词
-        text = " ".join(chars)  # 用空格连接，便于tokenizer处理
-        
-        # 简单处理：直接把字符序列转为字符串
-        text = "".join(chars)
-        
-        # Tokenize
-        encoding = self.tokenizer(
-            text,
-            max_length=self.max_seq_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt',
-            is_split_into_words=False
-        )
-        
-        # 注意：BERT tokenizer可能会对字符进行进一步分词
-        # 我们需要处理标签对齐问题
-        # 为了简化，我们使用字符级别的tokenization
-        
-        # 重新实现：使用字符级别的方法
-        tokens = ['[CLS]']
-        label_ids = [self.tag2id['O']]  # [CLS] 标记为 O
-        
-        # 添加字符和标签
-        for char, tag in zip(chars[:self.max_seq_length-2], tags[:self.max_seq_length-2]):
-            tokens.append(char)
-            label_ids.append(self.tag2id.get(tag, self.tag2id['O']))
-        
-        tokens.append('[SEP]')
-        label_ids.append(self.tag2id['O'])  # [SEP] 标记为 O
-        
-        # 记录实际长度
-        seq_len = len(tokens)
-        
-        # 填充到max_seq_length
-        while len(tokens) < self.max_seq_length:
-            tokens.append('[PAD]')
-            label_ids.append(self.tag2id['PAD'])
-        
-        # 转换为ID
-        input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
-        
-        # 创建attention mask (1表示真实token，0表示padding)
-        attention_mask = [1 if token != '[PAD]' else 0 for token in tokens]
-        
-        # token_type_ids全为0（单句子任务）
-        token_type_ids = [0] * self.max_seq_length
-        
+        # 整个数据集已在初始化时一次性编码，这里只做索引
         return {
-            'input_ids': torch.tensor(input_ids, dtype=torch.long),
-            'attention_mask': torch.tensor(attention_mask, dtype=torch.long),
-            'token_type_ids': torch.tensor(token_type_ids, dtype=torch.long),
-            'labels': torch.tensor(label_ids, dtype=torch.long),
-            'seq_len': torch.tensor(seq_len, dtype=torch.long)
+            'input_ids': torch.from_numpy(self.input_ids[idx]),
+            'attention_mask': torch.from_numpy(self.attention_mask[idx]),
+            'token_type_ids': torch.from_numpy(self.token_type_ids[idx]),
+            'labels': torch.from_numpy(self.labels[idx]),
+            'seq_len': torch.tensor(self.seq_len[idx], dtype=torch.long)
         }
 
 
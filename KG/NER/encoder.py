@@ -0,0 +1,124 @@
+"""
+字符级编码器 - 训练与推理共用的向量化 char -> vocab id 转换
+"""
+import numpy as np
+from typing import Dict, List, Sequence, Union
+
+# 基本多文种平面 (BMP) 大小，覆盖全部常用汉字
+BMP_SIZE = 0x10000
+
+TextLike = Union[str, Sequence[str]]
+
+
+class CharEncoder:
+    """
+    字符级编码器
+
+    与 `tokenizer.convert_tokens_to_ids` 逐 token 查表的结果完全一致：
+    - BMP 字符通过 NumPy 查找表一次性映射
+    - BMP 以外的字符及多字符 token 通过字典查找
+    - 词表中不存在的字符回退到 [UNK]
+    """
+
+    def __init__(self, tokenizer, max_seq_length: int):
+        """
+        Args:
+            tokenizer: BERT tokenizer
+            max_seq_length: 最大序列长度（包括[CLS]和[SEP]）
+        """
+        self.max_seq_length = max_seq_length
+
+        self.vocab: Dict[str, int] = dict(tokenizer.get_vocab())
+        self.unk_id = self.vocab[tokenizer.unk_token]
+        self.cls_id = self.vocab[tokenizer.cls_token]
+        self.sep_id = self.vocab[tokenizer.sep_token]
+        self.pad_id = self.vocab[tokenizer.pad_token]
+
+        # BMP 查找表：码位 -> vocab id
+        self.bmp_table = np.full(BMP_SIZE, self.unk_id, dtype=np.int64)
+        for token, token_id in self.vocab.items():
+            if len(token) == 1 and ord(token) < BMP_SIZE:
+                self.bmp_table[ord(token)] = token_id
+
+    def _text_to_ids(self, text: str) -> np.ndarray:
+        """将字符串逐字符转为 vocab id"""
+        codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        in_bmp = codepoints < BMP_SIZE
+        if in_bmp.all():
+            return self.bmp_table[codepoints]
+
+        # 少量 BMP 以外的字符（如 emoji）走字典查找
+        ids = np.empty(len(codepoints), dtype=np.int64)
+        ids[in_bmp] = self.bmp_table[codepoints[in_bmp]]
+        for i in np.flatnonzero(~in_bmp):
+            ids[i] = self.vocab.get(text[i], self.unk_id)
+        return ids
+
+    def _content_ids(self, seq: TextLike) -> np.ndarray:
+        """获取截断后的内容 id（不包括[CLS]和[SEP]）"""
+        seq = seq[:self.max_seq_length - 2]
+        if isinstance(seq, str):
+            return self._text_to_ids(seq)
+        if all(len(token) == 1 for token in seq):
+            return self._text_to_ids("".join(seq))
+        return np.array([self.vocab.get(token, self.unk_id) for token in seq], dtype=np.int64)
+
+    def encode_batch(self, sequences: List[TextLike], pad_to_max_length: bool = True) -> Dict[str, np.ndarray]:
+        """
+        将一批字符串（或字符列表）编码为定长的 id / mask 矩阵
+
+        Args:
+            sequences: 字符串或字符列表的列表
+            pad_to_max_length: True 时填充到 max_seq_length（与训练一致），
+                False 时只填充到本批次最长序列
+
+        Returns:
+            input_ids, attention_mask, token_type_ids: [batch_size, seq_len]
+            seq_len: [batch_size] 实际序列长度（包括[CLS]和[SEP]）
+        """
+        content = [self._content_ids(seq) for seq in sequences]
+        content_lens = np.array([len(ids) for ids in content], dtype=np.int64)
+        seq_lens = content_lens + 2
+
+        batch_size = len(content)
+        width = self.max_seq_length if pad_to_max_length else int(seq_lens.max(initial=2))
+
+        input_ids = np.full((batch_size, width), self.pad_id, dtype=np.int64)
+        input_ids[:, 0] = self.cls_id
+
+        # 一次性散射所有内容 id：行号按长度重复，列号为行内偏移 + 1
+        if content_lens.sum() > 0:
+            rows = np.repeat(np.arange(batch_size), content_lens)
+            starts = np.cumsum(content_lens) - content_lens
+            cols = np.arange(content_lens.sum()) - np.repeat(starts, content_lens) + 1
+            input_ids[rows, cols] = np.concatenate(content)
+
+        input_ids[np.arange(batch_size), seq_lens - 1] = self.sep_id
+
+        attention_mask = (np.arange(width)[None, :] < seq_lens[:, None]).astype(np.int64)
+        token_type_ids = np.zeros((batch_size, width), dtype=np.int64)
+
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'token_type_ids': token_type_ids,
+            'seq_len': seq_lens
+        }
+
+    def encode_labels(self, tag_seqs: List[Sequence[str]], tag2id: Dict[str, int]) -> np.ndarray:
+        """
+        将一批标签序列编码为与 encode_batch 对齐的标签矩阵
+
+        [CLS] 和 [SEP] 标记为 O，padding 标记为 PAD
+        """
+        batch_size = len(tag_seqs)
+        o_id = tag2id['O']
+        labels = np.full((batch_size, self.max_seq_length), tag2id['PAD'], dtype=np.int64)
+
+        for i, tags in enumerate(tag_seqs):
+            tags = tags[:self.max_seq_length - 2]
+            labels[i, 0] = o_id
+            labels[i, 1:len(tags) + 1] = [tag2id.get(tag, o_id) for tag in tags]
+            labels[i, len(tags) + 1] = o_id
+
+        return labels
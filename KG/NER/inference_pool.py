@@ -0,0 +1,366 @@
+"""
+CPU 多副本推理池 - 每个副本一个进程，独立线程数并绑定到固定的 CPU 核
+"""
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+import torch
+
+from config import Config
+from predict import CourseNER
+
+# 副本启动完成的消息标记
+_READY = '__ready__'
+# 等待副本加载模型的最长时间（秒）
+STARTUP_TIMEOUT = 600
+# 结果队列的轮询间隔（秒），每次超时检查一次副本是否存活
+_POLL_INTERVAL = 1.0
+
+
+def available_cores() -> List[int]:
+    """返回当前进程可用的 CPU 核编号"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _worker_main(replica_id, model_path, config, cpu_ids, num_threads, task_queue, result_queue):
+    """
+    副本进程入口：绑定CPU核、设置线程数、加载模型，然后循环处理请求
+    """
+    if cpu_ids and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_ids)
+    torch.set_num_threads(num_threads)
+
+    try:
+        ner = CourseNER(model_path, config)
+    except Exception as e:
+        result_queue.put((_READY, replica_id, repr(e)))
+        return
+    result_queue.put((_READY, replica_id, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:  # 关闭信号
+            break
+
+        task_id, texts = task
+        start = time.perf_counter()
+        try:
+            entities = ner.predict_batch(texts, batch_size=len(texts))
+            result_queue.put((task_id, True, (entities, time.perf_counter() - start)))
+        except Exception as e:
+            result_queue.put((task_id, False, repr(e)))
+
+
+class InferencePool:
+    """
+    CourseNER 多副本推理池
+
+    启动 K 个工作进程，每个进程持有一份模型副本、使用 threads_per_replica 个
+    intra-op 线程并绑定到互不重叠的 CPU 核。请求通过共享队列分发给空闲副本。
+    对外接口与 CourseNER 一致（predict / predict_batch / extract_courses）。
+    """
+
+    def __init__(self, model_path: str, config: Config = None, num_replicas: int = None,
+                 threads_per_replica: int = None, chunk_size: int = None):
+        """
+        Args:
+            model_path: 训练好的模型路径
+            config: 配置对象
+            num_replicas: 副本数（默认取 config.num_replicas）
+            threads_per_replica: 每个副本的线程数（默认平均分配可用CPU核）
+            chunk_size: 每个请求块包含的文本数（默认取 config.pool_chunk_size）
+        """
+        self.config = config if config else Config()
+        self.num_replicas = num_replicas or self.config.num_replicas
+        self.chunk_size = chunk_size or self.config.pool_chunk_size
+
+        cores = available_cores()
+        self.threads_per_replica = (
+            threads_per_replica or self.config.threads_per_replica
+            or max(1, len(cores) // self.num_replicas)
+        )
+
+        ctx = mp.get_context('spawn')
+        self.task_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._closed = False
+        self._error = None  # 副本异常退出后，后续请求直接报错
+
+        # 启动副本，第 i 个副本绑定到第 i 段CPU核（核不够时不绑定）
+        print(f"Starting {self.num_replicas} replica(s) x {self.threads_per_replica} thread(s)...")
+        self.workers = []
+        for i in range(self.num_replicas):
+            cpu_ids = cores[i * self.threads_per_replica:(i + 1) * self.threads_per_replica]
+            if len(cpu_ids) < self.threads_per_replica:
+                cpu_ids = None
+            worker = ctx.Process(
+                target=_worker_main,
+                args=(i, model_path, self.config, cpu_ids, self.threads_per_replica,
+                      self.task_queue, self.result_queue),
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+        # 等待所有副本加载完成；副本在发出 READY 前崩溃或超时都会报错，而不是一直阻塞
+        ready = set()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while len(ready) < self.num_replicas:
+            try:
+                tag, replica_id, error = self.result_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                error = self._dead_replica(exclude=ready)
+                if error is None and time.monotonic() > deadline:
+                    error = f"replicas not ready after {STARTUP_TIMEOUT}s"
+                if error is not None:
+                    self.close()
+                    raise RuntimeError(f"Inference pool failed to start: {error}")
+                continue
+            if error is not None:
+                self.close()
+                raise RuntimeError(f"Replica {replica_id} failed to start: {error}")
+            ready.add(replica_id)
+
+        # 结果收集线程：把副本返回的结果交给对应的 Future
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        print("Inference pool ready!")
+
+    def _dead_replica(self, exclude=()):
+        """返回第一个已退出副本的描述，全部存活时返回 None"""
+        for i, worker in enumerate(self.workers):
+            if i not in exclude and not worker.is_alive():
+                return f"replica {i} exited with code {worker.exitcode}"
+        return None
+
+    def _fail_pending(self, error: str):
+        """副本异常退出：无法确定它手上的请求，让所有未完成的 Future 报错"""
+        with self._pending_lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Inference pool broken: {error}"))
+
+    def _deliver(self, message):
+        task_id, ok, payload = message
+        with self._pending_lock:
+            future = self._pending.pop(task_id, None)
+        if future is None:
+            return
+        if ok:
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def _collect_results(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                message = self.result_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                message = False
+            if message is None:
+                break
+            if message:
+                self._deliver(message)
+
+            # 队列空闲或距上次检查超过轮询间隔时，检查副本是否存活
+            if message and time.monotonic() - last_check < _POLL_INTERVAL:
+                continue
+            last_check = time.monotonic()
+            error = None if self._closed else self._dead_replica()
+            if error is None:
+                continue
+            # 先交付已经返回的结果，剩下的请求可能在退出的副本手上，全部报错
+            try:
+                while True:
+                    message = self.result_queue.get_nowait()
+                    if message is None:
+                        return
+                    self._deliver(message)
+            except queue.Empty:
+                pass
+            print(f"Error: {error}, failing {len(self._pending)} pending request(s)")
+            self._fail_pending(error)
+            break
+
+    def _submit(self, texts: List[str]) -> Future:
+        """提交一个请求块，Future 的结果为 (实体列表, 副本内耗时秒数)"""
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._pending_lock:
+            if self._error is not None:
+                raise RuntimeError(f"Inference pool broken: {self._error}")
+            self._pending[task_id] = future
+        self.task_queue.put((task_id, texts))
+        return future
+
+    def predict_batch(self, texts: List[str], batch_size: int = None) -> List[List[Tuple[str, str, int, int]]]:
+        """
+        批量预测，按 batch_size 切块后分发到各副本并行处理
+
+        Returns:
+            与texts一一对应的实体列表
+        """
+        batch_size = batch_size or self.chunk_size
+        futures = [
+            self._submit(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+
+        results = []
+        for future in futures:
+            entities, _ = future.result()
+            results.extend(entities)
+        return results
+
+    def predict(self, text: str) -> List[Tuple[str, str, int, int]]:
+        return self.predict_batch([text])[0]
+
+    def extract_courses(self, text: str) -> List[str]:
+        entities = self.predict(text)
+        return [entity[0] for entity in entities if entity[1] == 'COURSE']
+
+    def close(self):
+        """关闭所有副本进程"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        if hasattr(self, '_collector'):
+            self.result_queue.put(None)
+            self._collector.join(timeout=10)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def benchmark_pool(pool: InferencePool, texts: List[str], chunk_size: int,
+                   concurrency: int = None) -> Dict[str, float]:
+    """
+    测量推理池在给定请求块大小下的吞吐量和延迟
+
+    同时保持 concurrency 个请求块在途（默认副本数的 2 倍），超出副本数的请求
+    在队列中等待，因此 p50_ms / p95_ms 是从提交到拿到结果的端到端延迟，包含排队时间。
+
+    Returns:
+        包含 throughput（句/秒）、p50_ms / p95_ms（端到端延迟）和
+        compute_p50_ms / compute_p95_ms（副本内计算耗时）的字典
+    """
+    concurrency = concurrency or 2 * pool.num_replicas
+
+    # 预热：每个副本至少处理一个请求块
+    warmup = [pool._submit(texts[:chunk_size]) for _ in range(pool.num_replicas)]
+    for future in warmup:
+        future.result()
+
+    slots = threading.Semaphore(concurrency)
+    latencies, compute_times = [], []
+    lock = threading.Lock()
+
+    def submit(chunk):
+        slots.acquire()
+        submitted = time.perf_counter()
+        future = pool._submit(chunk)
+
+        def done(f):
+            if f.exception() is None:
+                with lock:
+                    latencies.append(time.perf_counter() - submitted)
+                    compute_times.append(f.result()[1])
+            slots.release()
+
+        future.add_done_callback(done)
+        return future
+
+    start = time.perf_counter()
+    futures = [submit(texts[i:i + chunk_size]) for i in range(0, len(texts), chunk_size)]
+    # 拿回全部名额说明所有回调都已执行完
+    for _ in range(concurrency):
+        slots.acquire()
+    elapsed = time.perf_counter() - start
+    for future in futures:
+        future.result()  # 有请求失败时抛出异常
+
+    return {
+        'throughput': len(texts) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'compute_p50_ms': float(np.percentile(compute_times, 50) * 1000),
+        'compute_p95_ms': float(np.percentile(compute_times, 95) * 1000),
+    }
+
+
+def autotune(model_path: str, sample_texts: List[str], config: Config = None,
+             latency_target_ms: float = None, chunk_size: int = None) -> Dict[str, Any]:
+    """
+    自动选择副本数 K 和每副本线程数，在满足 p95 延迟目标的前提下最大化吞吐量
+
+    候选组合为 threads ∈ {1, 2, 4, ...}，K = 可用核数 // threads。
+
+    Args:
+        model_path: 训练好的模型路径
+        sample_texts: 用于测量的样例文本
+        config: 配置对象
+        latency_target_ms: 单个请求块的 p95 端到端延迟上限（含排队，默认取 config.latency_target_ms）
+        chunk_size: 请求块大小（默认取 config.pool_chunk_size）
+
+    Returns:
+        最优的 num_replicas / threads_per_replica 以及所有候选的测量结果
+    """
+    config = config if config else Config()
+    latency_target_ms = latency_target_ms or config.latency_target_ms
+    chunk_size = chunk_size or config.pool_chunk_size
+
+    num_cores = len(available_cores())
+    candidates = []
+    threads = 1
+    while threads <= num_cores:
+        candidates.append((num_cores // threads, threads))
+        threads *= 2
+
+    results = []
+    for num_replicas, threads_per_replica in candidates:
+        with InferencePool(model_path, config, num_replicas, threads_per_replica, chunk_size) as pool:
+            metrics = benchmark_pool(pool, sample_texts, chunk_size)
+        metrics.update({'num_replicas': num_replicas, 'threads_per_replica': threads_per_replica})
+        results.append(metrics)
+        print(f"  K={num_replicas:<3} threads={threads_per_replica:<3} "
+              f"throughput={metrics['throughput']:.1f} sent/s  p95={metrics['p95_ms']:.1f}ms "
+              f"(compute p95={metrics['compute_p95_ms']:.1f}ms)")
+
+    # 优先满足延迟目标；都不满足时取延迟最低的组合
+    feasible = [r for r in results if r['p95_ms'] <= latency_target_ms]
+    if feasible:
+        best = max(feasible, key=lambda r: r['throughput'])
+    else:
+        print(f"Warning: no configuration meets p95 <= {latency_target_ms}ms, picking the fastest one")
+        best = min(results, key=lambda r: r['p95_ms'])
+
+    return {
+        'num_replicas': best['num_replicas'],
+        'threads_per_replica': best['threads_per_replica'],
+        'candidates': results,
+    }
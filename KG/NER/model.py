@@ -72,6 +72,31 @@ class BertBiLSTMCRF(BertPreTrainedModel):
             如果labels不为None，返回loss
             否则返回预测的标签序列
         """
+        emissions = self.get_emissions(input_ids, attention_mask, token_type_ids)
+        # emissions: [batch_size, seq_len, num_tags]
+        
+        # 6. CRF处理
+        if labels is not None:
+            # 训练模式：计算负对数似然损失
+            # CRF的mask：1表示真实token，0表示padding
+            mask = attention_mask.bool()
+            
+            # CRF loss (negative log likelihood)
+            loss = -self.crf(emissions, labels, mask=mask, reduction='mean')
+            return loss
+        else:
+            # 预测模式：使用viterbi算法解码最优路径
+            mask = attention_mask.bool()
+            predictions = self.crf.decode(emissions, mask=mask)
+            return predictions
+    
+    def get_emissions(self, input_ids, attention_mask=None, token_type_ids=None):
+        """
+        计算CRF之前的发射分数 (BERT -> BiLSTM -> 全连接)
+        
+        Returns:
+            emissions: [batch_size, seq_len, num_tags]
+        """
         # 1. BERT编码
         bert_outputs = self.bert(
             input_ids=input_ids,
@@ -97,20 +122,7 @@ class BertBiLSTMCRF(BertPreTrainedModel):
         emissions = self.classifier(lstm_output)
         # emissions: [batch_size, seq_len, num_tags]
         
-        # 6. CRF处理
-        if labels is not None:
-            # 训练模式：计算负对数似然损失
-            # CRF的mask：1表示真实token，0表示padding
-            mask = attention_mask.bool()
-            
-            # CRF loss (negative log likelihood)
-            loss = -self.crf(emissions, labels, mask=mask, reduction='mean')
-            return loss
-        else:
-            # 预测模式：使用viterbi算法解码最优路径
-            mask = attention_mask.bool()
-            predictions = self.crf.decode(emissions, mask=mask)
-            return predictions
+        return emissions
     
     def get_bert_embedding(self, input_ids, attention_mask=None, token_type_ids=None):
         """
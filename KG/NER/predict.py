@@ -1,6 +1,8 @@
 """
 预测脚本 - 使用训练好的模型进行课程名称抽取
 """
+import json
+import argparse
 import torch
 from transformers import BertTokenizer, BertConfig as BertModelConfig
 from typing import List, Tuple
@@ -8,6 +10,7 @@ from pathlib import Path
 
 from config import Config
 from model import BertBiLSTMCRF
+from encoder import CharEncoder
 
 
 class CourseNER:
@@ -25,6 +28,7 @@ class CourseNER:
         # 加载tokenizer
         print(f"Loading tokenizer from {self.config.pretrained_model}...")
         self.tokenizer = BertTokenizer.from_pretrained(self.config.pretrained_model)
+        self.encoder = CharEncoder(self.tokenizer, self.config.max_seq_length)
         
         # 加载模型
         print(f"Loading model from {model_path}...")
@@ -57,38 +61,54 @@ class CourseNER:
             List of (entity_text, entity_type, start_pos, end_pos)
             例如: [("计算机网络", "COURSE", 10, 15)]
         """
-        # 将文本转为字符列表
-        chars = list(text)
-        
-        # 准备输入
-        tokens = ['[CLS]'] + chars[:self.config.max_seq_length-2] + ['[SEP]']
+        return self.predict_batch([text])[0]
+    
+    def predict_batch(self, texts: List[str], batch_size: int = 32) -> List[List[Tuple[str, str, int, int]]]:
+        """
+        批量预测多条文本中的课程名称
         
-        # 填充
-        while len(tokens) < self.config.max_seq_length:
-            tokens.append('[PAD]')
+        Args:
+            texts: 输入文本列表
+            batch_size: 每次前向传播的文本数
         
-        # 转换为ID
-        input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
-        attention_mask = [1 if token != '[PAD]' else 0 for token in tokens]
-        token_type_ids = [0] * self.config.max_seq_length
+        Returns:
+            与texts一一对应的实体列表
+        """
+        results = []
         
-        # 转为tensor
-        input_ids = torch.tensor([input_ids], dtype=torch.long).to(self.device)
-        attention_mask = torch.tensor([attention_mask], dtype=torch.long).to(self.device)
-        token_type_ids = torch.tensor([token_type_ids], dtype=torch.long).to(self.device)
+        for start in range(0, len(texts), batch_size):
+            batch_texts = texts[start:start + batch_size]
+            
+            # 向量化编码（与训练时共用同一个编码器）
+            encoded = self.encoder.encode_batch(batch_texts)
+            input_ids = torch.from_numpy(encoded['input_ids']).to(self.device)
+            attention_mask = torch.from_numpy(encoded['attention_mask']).to(self.device)
+            token_type_ids = torch.from_numpy(encoded['token_type_ids']).to(self.device)
+            
+            # 预测
+            with torch.no_grad():
+                predictions = self.model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    token_type_ids=token_type_ids
+                )
+            
+            for text, pred_tags in zip(batch_texts, predictions):
+                results.append(self._decode_entities(list(text), pred_tags))
         
-        # 预测
-        with torch.no_grad():
-            predictions = self.model(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-                token_type_ids=token_type_ids
-            )
+        return results
+    
+    def _decode_entities(self, chars: List[str], pred_tags: List[int]) -> List[Tuple[str, str, int, int]]:
+        """
+        将预测的标签序列解析为实体
         
-        # 解析预测结果
-        pred_tags = predictions[0]  # 第一个样本
+        Args:
+            chars: 字符列表
+            pred_tags: 预测的标签ID序列（包括[CLS]和[SEP]）
         
-        # 提取实体
+        Returns:
+            List of (entity_text, entity_type, start_pos, end_pos)
+        """
         entities = []
         current_entity = []
         current_type = None
@@ -143,21 +163,27 @@ class CourseNER:
         return courses
 
 
-def demo():
-    """演示预测功能"""
+def demo(ner=None):
+    """
+    演示预测功能
     
-    config = Config()
-    
-    # 模型路径
-    model_path = Path(config.output_dir) / "best_model.pth"
-    
-    if not model_path.exists():
-        print(f"Error: Model not found at {model_path}")
-        print("Please train the model first using: python train_ner.py")
-        return
+    Args:
+        ner: CourseNER 或 InferencePool，为None时从默认路径加载CourseNER
+    """
     
-    # 初始化预测器
-    ner = CourseNER(str(model_path), config)
+    if ner is None:
+        config = Config()
+        
+        # 模型路径
+        model_path = Path(config.output_dir) / "best_model.pth"
+        
+        if not model_path.exists():
+            print(f"Error: Model not found at {model_path}")
+            print("Please train the model first using: python train_ner.py")
+            return
+        
+        # 初始化预测器
+        ner = CourseNER(str(model_path), config)
     
     # 测试样例
     test_texts = [
@@ -213,5 +239,79 @@ def demo():
     print("\n感谢使用!")
 
 
+def predict_file(ner, input_file: str, output_file: str) -> None:
+    """
+    批量预测：输入文件每行一条文本，结果以JSONL写入输出文件
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+    
+    print(f"Predicting {len(texts)} texts from {input_file}...")
+    all_entities = ner.predict_batch(texts)
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for text, entities in zip(texts, all_entities):
+            record = {
+                'text': text,
+                'entities': [
+                    {'text': e[0], 'type': e[1], 'start': e[2], 'end': e[3]}
+                    for e in entities
+                ]
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    
+    print(f"Saved predictions to {output_file}")
+
+
+def main():
+    """命令行入口：交互式演示，或通过推理池进行批量预测"""
+    config = Config()
+    
+    parser = argparse.ArgumentParser(description="课程名称抽取")
+    parser.add_argument('--model', default=str(Path(config.output_dir) / "best_model.pth"), help='模型路径')
+    parser.add_argument('--input', help='批量预测的输入文件（每行一条文本）')
+    parser.add_argument('--output', default='predictions.jsonl', help='批量预测的输出文件')
+    parser.add_argument('--replicas', type=int, default=config.num_replicas, help='推理池副本数')
+    parser.add_argument('--threads', type=int, default=config.threads_per_replica, help='每个副本的线程数')
+    parser.add_argument('--autotune', action='store_true', help='自动选择副本数和线程数')
+    parser.add_argument('--latency-ms', type=float, default=config.latency_target_ms, help='自动调优的p95延迟目标')
+    args = parser.parse_args()
+    
+    if not Path(args.model).exists():
+        print(f"Error: Model not found at {args.model}")
+        print("Please train the model first using: python train_ner.py")
+        return
+    
+    if args.autotune or args.replicas > 1:
+        from inference_pool import InferencePool, autotune
+        
+        if args.autotune:
+            sample_texts = []
+            if args.input:
+                with open(args.input, 'r', encoding='utf-8') as f:
+                    sample_texts = [line.strip() for line in f if line.strip()][:256]
+            if not sample_texts:
+                sample_texts = ["本学期我修读了计算机网络和数据结构两门课程"] * 256
+            
+            print("Autotuning inference pool...")
+            best = autotune(args.model, sample_texts, config, latency_target_ms=args.latency_ms)
+            args.replicas = best['num_replicas']
+            args.threads = best['threads_per_replica']
+            print(f"Selected {args.replicas} replica(s) x {args.threads} thread(s)")
+        
+        ner = InferencePool(args.model, config, args.replicas, args.threads)
+    else:
+        ner = CourseNER(args.model, config)
+    
+    try:
+        if args.input:
+            predict_file(ner, args.input, args.output)
+        else:
+            demo(ner)
+    finally:
+        if hasattr(ner, 'close'):
+            ner.close()
+
+
 if __name__ == "__main__":
-    demo()
+    main()
@@ -3,6 +3,10 @@ import random
 import requests
 import time
 import os
+import argparse
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration
 API_URL = "https://api.siliconflow.cn/v1/chat/completions"
@@ -10,7 +14,14 @@ API_KEY = "sk-hpghpzramrqsxlkrvlepvjjbgerfhiafohkkjpqjpyluzspu"
 MODEL = "Qwen/QwQ-32B"
 INPUT_FILE = "/root/e2e/fine-tune/Dist/instructions.json"
 OUTPUT_FILE = "/root/e2e/fine-tune/Dist/alpaca_data.json"
-NUM_SAMPLES = 50  # Number of samples to generate
+JSONL_FILE = "/root/e2e/fine-tune/Dist/alpaca_data.jsonl"  # Append-only progress, one sample per line
+NUM_SAMPLES = 50  # Target number of samples (existing JSONL lines count towards it)
+FLUSH_EVERY = 20  # fsync the JSONL file after this many samples...
+FLUSH_INTERVAL = 30  # ...or this many seconds, whichever comes first
+CONCURRENCY = 8  # Requests in flight at once (1 = sequential)
+REQUESTS_PER_MINUTE = 60  # Request start rate limit (account RPM quota)
+REQUEST_TIMEOUT = 600  # seconds; QwQ reasoning outputs can take minutes
+MAX_RETRIES = 3  # Retries on 429 / 5xx / network errors
 
 def load_instructions(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -25,70 +36,245 @@ def construct_prompt(pref, intention, task):
     ]
     return random.choice(templates)
 
-def generate_data():
-    data = load_instructions(INPUT_FILE)
-    
-    preferences = data['preferences']['explicit_preferences'] + data['preferences']['implicit_preferences']
-    intentions = data['intentions']
-    task_forms = data['task_forms']
-    
-    output_data = []
+# Set on Ctrl-C: workers stop starting new attempts, in-flight requests finish
+stop_event = threading.Event()
+
+class RateLimiter:
+    """Spaces request starts evenly so at most `rpm` requests start per minute (thread-safe)"""
     
-    print(f"Starting generation of {NUM_SAMPLES} samples...")
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
     
-    for i in range(NUM_SAMPLES):
-        pref = random.choice(preferences)
-        intention = random.choice(intentions)
-        task = random.choice(task_forms)
-        
-        prompt = construct_prompt(pref, intention, task)
-        
-        payload = {
-            "model": MODEL,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        }
-        
-        headers = {
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            stop_event.wait(start - now)
+
+def parse_retry_after(value):
+    """Retry-After header (seconds, possibly fractional, or an HTTP date) -> seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+_local = threading.local()
+
+def get_session():
+    # One keep-alive session per worker thread
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+        _local.session.headers.update({
             "Authorization": f"Bearer {API_KEY}",
             "Content-Type": "application/json"
-        }
-        
+        })
+    return _local.session
+
+def request_sample(prompt, limiter):
+    """Send one prompt, retrying 429 / 5xx / network errors; returns the Alpaca record or None"""
+    payload = {
+        "model": MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    }
+    
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.wait()
+        if stop_event.is_set():
+            return None
         try:
-            print(f"Sending request {i+1}/{NUM_SAMPLES}...")
-            response = requests.post(API_URL, json=payload, headers=headers)
+            response = get_session().post(API_URL, json=payload, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt < MAX_RETRIES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = retry_after if retry_after is not None else 2 ** attempt * 5
+                    print(f"HTTP {response.status_code}, retrying in {delay:.1f}s...")
+                    stop_event.wait(delay)
+                    continue
             response.raise_for_status()
             res_json = response.json()
-            
-            # Handle potential API errors or unexpected formats
-            if 'choices' in res_json and len(res_json['choices']) > 0:
-                content = res_json['choices'][0]['message']['content']
-                
-                output_data.append({
-                    "instruction": prompt,
-                    "input": "",
-                    "output": content
-                })
-                print(f"Request {i+1} successful.")
-            else:
-                print(f"Request {i+1} failed: No choices in response. Response: {res_json}")
-                
-        except Exception as e:
-            print(f"Error on sample {i+1}: {e}")
-            if hasattr(e, 'response') and e.response is not None:
+        except requests.exceptions.HTTPError as e:
+            print(f"Request failed: {e}")
+            if e.response is not None:
                 print(f"Response content: {e.response.text}")
+            return None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if attempt < MAX_RETRIES:
+                print(f"Request error: {e}, retrying...")
+                stop_event.wait(2 ** attempt * 5)
+                continue
+            print(f"Request failed: {e}")
+            return None
         
-        time.sleep(1)  # Rate limiting
-        
-    # Save to file
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        # Handle potential API errors or unexpected formats
+        if 'choices' in res_json and len(res_json['choices']) > 0:
+            content = res_json['choices'][0]['message']['content']
+            return {
+                "instruction": prompt,
+                "input": "",
+                "output": content
+            }
+        print(f"No choices in response. Response: {res_json}")
+        return None
+    return None
+
+def count_samples(path):
+    """Count complete samples in the JSONL file, cutting a line left half-written by a crash"""
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    valid_bytes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            count += 1
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(path):
+        print(f"Truncating incomplete data at the end of {path}")
+        with open(path, 'rb+') as f:
+            f.truncate(valid_bytes)
+    return count
+
+def convert_to_alpaca(jsonl_file=JSONL_FILE, output_file=OUTPUT_FILE):
+    """Write the JSONL samples as the final Alpaca JSON array"""
+    count_samples(jsonl_file)  # Cut a line left half-written by a crash first
+    with open(jsonl_file, 'r', encoding='utf-8') as f:
+        output_data = [json.loads(line) for line in f if line.strip()]
+    with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(output_data, f, ensure_ascii=False, indent=4)
+    return len(output_data)
+
+def draw_prompts(data, n):
+    preferences = data['preferences']['explicit_preferences'] + data['preferences']['implicit_preferences']
+    intentions = data['intentions']
+    task_forms = data['task_forms']
+    
+    prompts = []
+    for _ in range(n):
+        pref = random.choice(preferences)
+        intention = random.choice(intentions)
+        task = random.choice(task_forms)
+        prompts.append(construct_prompt(pref, intention, task))
+    return prompts
+
+def run_batch(prompts, out, limiter, concurrency, existing, target):
+    """Send one batch of prompts and append each sample to `out` as it finishes; returns samples written"""
+    written = 0
+    failed = 0
+    start = time.monotonic()
+    last_sync = start
+    
+    def sync():
+        out.flush()
+        os.fsync(out.fileno())
     
-    print(f"Data generation complete. Saved {len(output_data)} samples to {OUTPUT_FILE}")
+    def append(sample):
+        nonlocal written
+        # Only the main thread writes, so lines never interleave
+        out.write(json.dumps(sample, ensure_ascii=False) + "\n")
+        written += 1
+    
+    # A pool of `concurrency` threads caps the number of requests in flight
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    futures = [executor.submit(request_sample, prompt, limiter) for prompt in prompts]
+    try:
+        for i, future in enumerate(as_completed(futures)):
+            sample = future.result()
+            if sample is not None:
+                append(sample)
+            else:
+                failed += 1
+            
+            now = time.monotonic()
+            if (sample is not None and written % FLUSH_EVERY == 0) or now - last_sync >= FLUSH_INTERVAL:
+                sync()
+                last_sync = now
+            print(f"Progress {existing + written}/{target}: {failed} failed in this batch, "
+                  f"{(i + 1) / (now - start) * 60:.1f} requests/min")
+    except KeyboardInterrupt:
+        # Drop queued requests, but keep the answers of those already running
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        running = [f for f in futures if not f.done()]
+        print(f"\nInterrupted: saving {len(running)} in-flight request(s) as they finish "
+              f"(Ctrl-C again to abandon them)")
+        try:
+            for future in as_completed(running):
+                if not future.cancelled() and future.result() is not None:
+                    append(future.result())
+        except KeyboardInterrupt:
+            sync()
+            print(f"Abandoned in-flight requests; {existing + written} samples saved in {out.name}")
+            # Worker threads would keep the interpreter alive until their requests time out
+            os._exit(130)
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        sync()
+    return written
+
+def generate_data(num_samples=NUM_SAMPLES, concurrency=CONCURRENCY, rpm=REQUESTS_PER_MINUTE, fresh=False):
+    data = load_instructions(INPUT_FILE)
+    
+    if fresh and os.path.exists(JSONL_FILE):
+        os.remove(JSONL_FILE)
+    existing = count_samples(JSONL_FILE)
+    if existing:
+        print(f"Resuming: {existing} samples already in {JSONL_FILE}")
+    
+    limiter = RateLimiter(rpm)
+    print(f"Generating up to {num_samples} samples "
+          f"({concurrency} in flight, {rpm or 'unlimited'} requests/min)...")
+    
+    with open(JSONL_FILE, 'a', encoding='utf-8') as out:
+        # Failed requests leave the target short; top up until it is reached or a batch makes no progress
+        while existing < num_samples:
+            # Prompts are drawn up front in the main thread, so worker threads never touch `random`
+            prompts = draw_prompts(data, num_samples - existing)
+            written = run_batch(prompts, out, limiter, concurrency, existing, num_samples)
+            existing += written
+            if written == 0:
+                print("No samples generated in the last batch, stopping")
+                break
+    
+    total = convert_to_alpaca(JSONL_FILE, OUTPUT_FILE)
+    print(f"Data generation complete. Saved {total} samples to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    generate_data()
+    parser = argparse.ArgumentParser(description="Generate Alpaca samples with QwQ-32B")
+    parser.add_argument("--num-samples", type=int, default=NUM_SAMPLES, help="Target number of samples")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Requests in flight (1 = sequential)")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="Max requests started per minute (0 = no limit)")
+    parser.add_argument("--fresh", action="store_true", help=f"Discard {JSONL_FILE} instead of resuming")
+    parser.add_argument("--convert", action="store_true", help="Only convert the JSONL file to Alpaca JSON")
+    args = parser.parse_args()
+    if args.convert:
+        if not os.path.exists(JSONL_FILE):
+            parser.error(f"{JSONL_FILE} not found; run generation first")
+        total = convert_to_alpaca(JSONL_FILE, OUTPUT_FILE)
+        print(f"Converted {total} samples to {OUTPUT_FILE}")
+    else:
+        try:
+            generate_data(args.num_samples, args.concurrency, args.rpm, args.fresh)
+        except KeyboardInterrupt:
+            print(f"Stopped. Samples so far are in {JSONL_FILE}; run again to resume")
+            raise SystemExit(130)
@@ -0,0 +1,73 @@
+"""
+Persistent cache of LLM augmentations
+
+Responses are keyed by a hash of the model name and the fully rendered
+prompt, so two polls only share an entry when they would send exactly the
+same request. Entries survive across runs: re-running the pipeline after a
+change that does not touch the prompts costs no API calls.
+"""
+
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS augmentations (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    response   TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    """Stable cache key for a (model, prompt) request"""
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class AugmentationCache:
+    """SQLite-backed cache of generated texts (thread-safe)"""
+
+    def __init__(self, db_path: str = "augment_cache.db"):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response FROM augmentations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, model: str, response: str) -> None:
+        """Store a successful response"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO augmentations (key, model, response, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time())
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM augmentations").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,102 @@
+"""
+End-to-end throughput benchmark for DPOPipeline
+
+Starts MockArkServer in the background, runs the full pipeline (dedup,
+scheduling, client, writer, ledger) against it on output.json and reports
+pairs per second. The persistent prompt cache is disabled so every pair
+costs real requests; output goes to a temporary directory.
+
+Usage:
+    python bench_pipeline.py --polls 500 --latency lognormal --latency-mean 1.0
+    python bench_pipeline.py --max-concurrency 16 --retry-after 1 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+
+from dpo_pipeline import DPOPipeline
+from mock_ark_server import add_server_arguments, server_from_args
+from config import COMBINED_MODE, INITIAL_CONCURRENCY, MAX_CONCURRENCY
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DPOPipeline against a local mock Ark server")
+    parser.add_argument("--input", default="output.json", help="Poll data JSON file")
+    parser.add_argument("--polls", type=int, default=None, help="Only use the first N polls")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        polls = json.load(f)
+    if args.polls is not None:
+        polls = polls[:args.polls]
+
+    server = server_from_args(args)
+    url = server.start_in_thread()
+    print(f"Mock server: {url} (latency {args.latency} mean {args.latency_mean}s, "
+          f"429 rate {args.rate_429}, max concurrency {args.max_concurrency or 'unlimited'})")
+    print(f"Polls: {len(polls)} | combined mode: {COMBINED_MODE} | "
+          f"concurrency {INITIAL_CONCURRENCY}..{MAX_CONCURRENCY}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "polls.json")
+        with open(input_file, "w", encoding="utf-8") as f:
+            json.dump(polls, f, ensure_ascii=False)
+
+        pipeline = DPOPipeline(input_file, use_cache=False, endpoint=url)
+        output = None if args.verbose else open(os.devnull, "w")
+        started = time.monotonic()
+        try:
+            with contextlib.redirect_stdout(output or sys.stdout):
+                pipeline.run(os.path.join(tmpdir, "dpo_dataset.jsonl"), fresh=True)
+        finally:
+            elapsed = time.monotonic() - started
+            if output is not None:
+                output.close()
+            server.stop()
+
+    snapshot = pipeline.metrics.snapshot()
+    pairs = pipeline.stats["total_examples"]
+    latency = snapshot["latency_seconds"]
+    results = {
+        "polls": len(polls),
+        "pairs": pairs,
+        "elapsed_seconds": round(elapsed, 3),
+        "pairs_per_second": round(pairs / elapsed, 3) if elapsed else 0.0,
+        "requests": snapshot["requests"],
+        "requests_per_second": round(snapshot["requests"] / elapsed, 3) if elapsed else 0.0,
+        "status_counts": snapshot["status_counts"],
+        "retries": snapshot["retries"],
+        "latency_p50": latency["p50"],
+        "latency_p95": latency["p95"],
+        "duplicate_polls": pipeline.stats["duplicate_polls"],
+        "combined_fallbacks": pipeline.stats["combined_fallbacks"],
+        "final_concurrency": int(pipeline.client.limiter.limit),
+        "server": server.stats,
+    }
+
+    print("=" * 60)
+    print(f"Pairs: {pairs} in {elapsed:.1f}s -> {results['pairs_per_second']:.2f} pairs/sec")
+    print(f"Requests: {results['requests']} ({results['requests_per_second']:.2f}/sec), "
+          f"retries {results['retries']}, statuses {results['status_counts']}")
+    print(f"Latency p50 {latency['p50']}s p95 {latency['p95']}s")
+    print(f"Final concurrency limit: {results['final_concurrency']} "
+          f"(server peak in flight {server.stats['peak_in_flight']})")
+    print(f"Server: {server.stats}")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -48,15 +48,74 @@ REJECTED_PROMPT = """你是一个专业的职场顾问。我会给你一个求
 
 请分析为什么"{rejected_text}"相对不太适合这位求职者，写一段客观的分析（100-150字）："""
 
+# One-call mode: ask for both analyses as one JSON object (falls back to two calls if invalid)
+COMBINED_MODE = True
+
+COMBINED_PROMPT = """你是一个专业的职场顾问。我会给你一个求职者的背景和两个选项。胜出的选项是"{chosen_text}"，另一个选项"{rejected_text}"获得的票数较少。请根据求职者的描述，分别写出 Chosen Response 和 Rejected Response。
+
+求职者背景和问题：
+{context}
+
+两个选项：
+1. {chosen_text} (获得 {chosen_votes} 票，{chosen_percentage})
+2. {rejected_text} (获得 {rejected_votes} 票，{rejected_percentage})
+
+请完成两段分析：
+- chosen：分析为什么"{chosen_text}"更适合这位求职者，写一段详细的推荐理由（100-150字）
+- rejected：分析为什么"{rejected_text}"相对不太适合这位求职者，写一段客观的分析（100-150字）
+
+只输出一个 JSON 对象，不要输出其他内容，格式如下：
+{{"chosen": "...", "rejected": "..."}}"""
+
+# Near-duplicate Poll Filter (MinHash + LSH over content and option texts)
+DEDUP_POLLS = True
+DEDUP_THRESHOLD = 0.8  # Estimated Jaccard similarity of character shingles
+DEDUP_NUM_PERM = 128
+DEDUP_SHINGLE_SIZE = 5
+
+# Persistent Augmentation Cache (keyed by model + rendered prompt)
+USE_CACHE = True
+CACHE_DB = "augment_cache.db"
+
+# Metrics
+METRICS_INTERVAL = 30  # Seconds between progress lines (0 disables them)
+PRICE_PER_M_INPUT_TOKENS = 0.8  # CNY per million input tokens, for the spend estimate
+PRICE_PER_M_OUTPUT_TOKENS = 8.0  # CNY per million output tokens
+
 # Output Configuration
-OUTPUT_FILE = "dpo_dataset.jsonl"
+OUTPUT_FILE = "dpo_dataset.jsonl"  # A ".zst" suffix writes zstd-compressed JSONL
 INCLUDE_METADATA = True
 
+# Training Export (export_dataset.py)
+EXPORT_DIR = "dpo_export"  # train/eval files are written here
+EXPORT_FORMAT = "arrow"  # "arrow" (IPC file, zero-copy memory map) or "parquet"
+EVAL_RATIO = 0.05  # Fraction of pairs assigned to eval, by a hash of the pair id
+EXPORT_BATCH_SIZE = 1000  # Rows per record batch / row group
+
+# Result Writer (single background thread)
+WRITER_FLUSH_BYTES = 256 * 1024  # Flush once this many bytes are buffered
+WRITER_FLUSH_INTERVAL = 2.0  # ...or once the oldest buffered line is this old (seconds)
+WRITER_CHECKPOINT_INTERVAL = 30.0  # fsync output and ledger this often (seconds)
+ZSTD_LEVEL = 3
+
 # API Rate Limiting
-MAX_RETRIES = 3
-RETRY_DELAY = 1  # seconds
+MAX_RETRIES = 6
+RETRY_DELAY = 1  # seconds, base of the jittered exponential backoff
+MAX_RETRY_DELAY = 60  # seconds, cap of the exponential backoff (Retry-After may exceed it)
 REQUEST_TIMEOUT = 30  # seconds
 
+# Adaptive Concurrency (AIMD): +1 slot per window of successes, halved on 429/timeout
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+TOKENS_PER_MINUTE = None  # Account TPM quota, e.g. 800_000; None disables the token budget
+EXPECTED_OUTPUT_TOKENS = 400  # Reserved per request until the real usage is known
+
+# Connection Pool
+MAX_CONNECTIONS = MAX_CONCURRENCY  # Keep-alive connections shared by all workers
+HTTP2 = True  # Multiplex requests over HTTP/2 (needs the h2 package)
+
 # Multi-threading Configuration
-MAX_WORKERS = 10  # Number of concurrent API requests
-WRITE_IMMEDIATELY = True  # Write results to file immediately instead of batching
+MAX_WORKERS = MAX_CONCURRENCY  # Worker threads; actual request concurrency is set by the limiter
+MAX_PENDING_JOBS = MAX_WORKERS * 4  # Submitted-but-unfinished jobs before submission blocks
+WRITE_IMMEDIATELY = True  # Stream results to the writer instead of saving them at the end
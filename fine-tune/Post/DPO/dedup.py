@@ -0,0 +1,222 @@
+"""
+Near-duplicate poll detection (MinHash + LSH)
+
+Reposts and near-identical "offer帮选" posts would each cost a full set of
+LLM calls. Every poll is reduced to the set of character shingles of its
+content plus option texts, summarised by a MinHash signature and indexed
+with banded LSH. A poll whose estimated Jaccard similarity to an earlier
+poll reaches the threshold is treated as a duplicate. The first poll of
+each cluster is kept as its representative.
+
+The filter works online (query, then insert), so it can run over a
+streamed input as well as a loaded list.
+
+Usage:
+    python dedup.py --input output.json --output output.dedup.json --threshold 0.8
+"""
+
+import re
+import json
+import zlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import (
+    DEDUP_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_SHINGLE_SIZE,
+)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WHITESPACE_RE = re.compile(r"\s+")
+_TAG_RE = re.compile(r"<[^>]*>")  # Inline emoji <img> tags would make unrelated posts look alike
+
+
+def poll_text(poll: Dict[str, Any]) -> str:
+    """Normalised text of a poll: content followed by its option texts, without tags or whitespace"""
+    parts = [poll.get("content", "")]
+    parts += [option.get("text", "") for option in poll.get("options", [])]
+    text = _TAG_RE.sub("", "\n".join(parts))
+    return _WHITESPACE_RE.sub("", text).lower()
+
+
+def shingles(text: str, k: int = DEDUP_SHINGLE_SIZE) -> Set[str]:
+    """Character k-grams of a text (the text itself if it is shorter than k)"""
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+# Weights of the false positive / false negative areas when picking LSH params.
+# A false positive only costs an exact signature comparison, a false negative
+# lets a duplicate through, so misses weigh much more.
+_FALSE_POSITIVE_WEIGHT = 0.1
+_FALSE_NEGATIVE_WEIGHT = 0.9
+# Minimum probability that a pair right at the threshold shares a bucket
+MIN_LSH_RECALL = 0.9
+
+
+def collision_probability(similarity: float, bands: int, rows: int) -> float:
+    """Probability that two signatures with this Jaccard similarity share at least one band"""
+    return 1.0 - (1.0 - similarity ** rows) ** bands
+
+
+def _integrate(f, lo: float, hi: float, steps: int = 1000) -> float:
+    width = (hi - lo) / steps
+    return sum(f(lo + (i + 0.5) * width) for i in range(steps)) * width
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_perm minimising the weighted
+    false positive area below the threshold plus the false negative area above it
+
+    Splits that find pairs at the threshold with less than MIN_LSH_RECALL
+    probability are only used when no split reaches it.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        false_positive = _integrate(lambda s: collision_probability(s, bands, rows), 0.0, threshold)
+        false_negative = _integrate(lambda s: 1.0 - collision_probability(s, bands, rows), threshold, 1.0)
+        error = _FALSE_POSITIVE_WEIGHT * false_positive + _FALSE_NEGATIVE_WEIGHT * false_negative
+        key = (collision_probability(threshold, bands, rows) < MIN_LSH_RECALL, error)
+        if best is None or key < best[0]:
+            best = (key, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """MinHash signatures using universal hashing h(x) = (a * x + b) mod p"""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: Set[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(item.encode("utf-8")) % _MERSENNE_PRIME for item in items),
+            dtype=np.uint64, count=len(items)
+        )
+        # (num_items, num_perm); a * h < 2^62 so uint64 does not overflow
+        permuted = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+class NearDuplicateFilter:
+    """
+    Online LSH index over poll signatures
+
+    Args:
+        threshold: Estimated Jaccard similarity at which polls count as duplicates
+        num_perm: MinHash signature length
+        shingle_size: Character shingle length
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        shingle_size: int = DEDUP_SHINGLE_SIZE
+    ):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        recall = collision_probability(threshold, self.bands, self.rows)
+        if recall < MIN_LSH_RECALL:
+            print(f"Warning: {num_perm} permutations find only {recall:.0%} of polls at similarity "
+                  f"{threshold}; use more permutations")
+
+        self.signatures = []  # Signatures of the kept representatives
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+        self.seen = 0
+        self.duplicates = 0
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find_duplicate(self, poll: Dict[str, Any]) -> Optional[int]:
+        """
+        Check a poll against the representatives seen so far
+
+        Returns:
+            Index (in keep order) of the representative it duplicates, or
+            None if the poll is new, in which case it becomes a representative
+        """
+        self.seen += 1
+        signature = self.hasher.signature(shingles(poll_text(poll), self.shingle_size))
+        keys = self._band_keys(signature)
+
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(self.buckets[band].get(key, ()))
+
+        for rep in sorted(candidates):
+            similarity = float(np.mean(self.signatures[rep] == signature))
+            if similarity >= self.threshold:
+                self.duplicates += 1
+                return rep
+
+        rep = len(self.signatures)
+        self.signatures.append(signature)
+        for band, key in enumerate(keys):
+            self.buckets[band][key].append(rep)
+        return None
+
+    def is_duplicate(self, poll: Dict[str, Any]) -> bool:
+        return self.find_duplicate(poll) is not None
+
+    def filter(self, polls: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield only the first poll of every near-duplicate cluster"""
+        for poll in polls:
+            if not self.is_duplicate(poll):
+                yield poll
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop near-duplicate polls before augmentation")
+    parser.add_argument("--input", default="output.json", help="Poll data JSON file")
+    parser.add_argument("--output", default="output.dedup.json", help="Deduplicated JSON file")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD, help="Jaccard threshold")
+    parser.add_argument("--num-perm", type=int, default=DEDUP_NUM_PERM, help="MinHash permutations")
+    parser.add_argument("--shingle-size", type=int, default=DEDUP_SHINGLE_SIZE, help="Character shingle length")
+    args = parser.parse_args()
+
+    # Imported here: dpo_pipeline imports this module
+    from dpo_pipeline import DPOPipeline
+    from config import COMBINED_MODE
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        polls = json.load(f)
+
+    dedup = NearDuplicateFilter(args.threshold, args.num_perm, args.shingle_size)
+    pipeline = DPOPipeline(args.input)  # For create_dpo_pairs; makes no API calls
+    kept, saved_pairs = [], 0
+    for poll in polls:
+        if dedup.is_duplicate(poll):
+            saved_pairs += len(pipeline.create_dpo_pairs(poll))
+        else:
+            kept.append(poll)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(kept, f, ensure_ascii=False, indent=2)
+
+    calls_per_pair = 1 if COMBINED_MODE else 2
+    recall = collision_probability(args.threshold, dedup.bands, dedup.rows)
+    print(f"LSH: {dedup.bands} bands x {dedup.rows} rows, threshold {args.threshold} "
+          f"(pairs at the threshold found with probability {recall:.1%})")
+    print(f"Kept {len(kept)}/{len(polls)} polls, dropped {dedup.duplicates} near-duplicates")
+    print(f"Saved {saved_pairs} pair(s), about {saved_pairs * calls_per_pair} API call(s)")
+    print(f"Output file: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,546 @@
 """
 Doubao API client for text augmentation
+
+AsyncDoubaoClient sends requests through one pooled httpx.AsyncClient
+(keep-alive, HTTP/2 when the h2 package is installed), so the TCP+TLS
+handshake to the Ark endpoint is paid once per connection instead of once
+per request. DoubaoClient is the synchronous wrapper used by the
+multi-threaded pipeline: it runs the async client on a background event
+loop and blocks the calling thread until its request finishes.
+
+Both clients check an optional AugmentationCache before every request,
+keyed by the model name and the rendered prompt, and concurrent calls
+with the same prompt are coalesced into one request. Requests pass through an
+AdaptiveLimiter (AIMD concurrency, Retry-After pauses) and, when
+TOKENS_PER_MINUTE is set, a TokenBudget. Failed requests are retried with
+jittered exponential backoff.
+
+augment_pair asks for the chosen and rejected analyses in one request and
+returns None when the reply is not the expected JSON object, so callers
+can fall back to two augment_option calls.
 """
 
-import requests
-import time
 import json
-from typing import Optional, Dict, Any
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
 from config import (
     DOUBAO_API_KEY,
     DOUBAO_API_ENDPOINT,
     DOUBAO_MODEL,
+    CHOSEN_PROMPT,
+    REJECTED_PROMPT,
+    COMBINED_PROMPT,
     MAX_RETRIES,
     RETRY_DELAY,
+    MAX_RETRY_DELAY,
     REQUEST_TIMEOUT,
+    MAX_CONNECTIONS,
+    HTTP2,
+    INITIAL_CONCURRENCY,
+    MIN_CONCURRENCY,
+    MAX_CONCURRENCY,
+    TOKENS_PER_MINUTE,
+    EXPECTED_OUTPUT_TOKENS,
 )
+from augment_cache import AugmentationCache, prompt_key
+from rate_limiter import AdaptiveLimiter, TokenBudget, backoff_delay, parse_retry_after
+from metrics import RequestMetrics
 
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
-class DoubaoClient:
-    """Client for interacting with Doubao API"""
-    
-    def __init__(self):
+
+def build_prompt(
+    context: str,
+    chosen_text: str,
+    rejected_text: str,
+    chosen_votes: int,
+    rejected_votes: int,
+    chosen_percentage: str,
+    rejected_percentage: str,
+    is_chosen: bool = True
+) -> str:
+    """
+    Render the chosen or rejected analysis prompt
+
+    Args:
+        context: Job seeker's background and question
+        chosen_text: The winning option text
+        rejected_text: The losing option text
+        chosen_votes: Votes for chosen option
+        rejected_votes: Votes for rejected option
+        chosen_percentage: Percentage for chosen option
+        rejected_percentage: Percentage for rejected option
+        is_chosen: True if analyzing chosen option, False for rejected
+
+    Returns:
+        Prompt text
+    """
+    template = CHOSEN_PROMPT if is_chosen else REJECTED_PROMPT
+    return template.format(
+        chosen_text=chosen_text,
+        rejected_text=rejected_text,
+        context=context,
+        chosen_votes=chosen_votes,
+        rejected_votes=rejected_votes,
+        chosen_percentage=chosen_percentage,
+        rejected_percentage=rejected_percentage
+    )
+
+
+def build_combined_prompt(
+    context: str,
+    chosen_text: str,
+    rejected_text: str,
+    chosen_votes: int,
+    rejected_votes: int,
+    chosen_percentage: str,
+    rejected_percentage: str
+) -> str:
+    """Render the one-call prompt asking for both analyses as JSON"""
+    return COMBINED_PROMPT.format(
+        chosen_text=chosen_text,
+        rejected_text=rejected_text,
+        context=context,
+        chosen_votes=chosen_votes,
+        rejected_votes=rejected_votes,
+        chosen_percentage=chosen_percentage,
+        rejected_percentage=rejected_percentage
+    )
+
+
+def parse_combined_response(text: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Validate a combined reply
+
+    Args:
+        text: Model output, possibly wrapped in a code fence or extra prose
+
+    Returns:
+        (chosen_analysis, rejected_analysis), or None unless the reply holds a
+        JSON object with non-empty string "chosen" and "rejected" fields
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        obj, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict):
+        return None
+
+    chosen, rejected = obj.get("chosen"), obj.get("rejected")
+    if not (isinstance(chosen, str) and isinstance(rejected, str)):
+        return None
+    if not (chosen.strip() and rejected.strip()):
+        return None
+    return chosen.strip(), rejected.strip()
+
+
+def build_payload(model: str, prompt: str) -> Dict[str, Any]:
+    """Build a Responses API request body with a single user message"""
+    return {
+        "model": model,
+        "input": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "input_text",
+                        "text": prompt
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def extract_output_text(result: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract the generated text from a Responses API result
+
+    Args:
+        result: Decoded JSON response
+
+    Returns:
+        Output text or None if the response contains none
+    """
+    # Parse Doubao API response structure
+    if "output" in result and len(result["output"]) > 0:
+        # Iterate through output items to find the message with output_text
+        for output_item in result["output"]:
+            if output_item.get("type") == "message":
+                content = output_item.get("content", [])
+                for content_item in content:
+                    if content_item.get("type") == "output_text":
+                        text = content_item.get("text", "").strip()
+                        if text:
+                            return text
+
+    # Fallback: try standard OpenAI-style response
+    if "choices" in result and len(result["choices"]) > 0:
+        return result["choices"][0].get("message", {}).get("content", "").strip()
+
+    return None
+
+
+def default_limiter() -> AdaptiveLimiter:
+    return AdaptiveLimiter(INITIAL_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY)
+
+
+def default_budget() -> Optional[TokenBudget]:
+    return TokenBudget(TOKENS_PER_MINUTE) if TOKENS_PER_MINUTE else None
+
+
+class AsyncDoubaoClient:
+    """Async client for the Doubao Responses API over a pooled connection"""
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        http2: bool = HTTP2,
+        cache: Optional[AugmentationCache] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        budget: Optional[TokenBudget] = None,
+        metrics: Optional[RequestMetrics] = None,
+        endpoint: Optional[str] = None
+    ):
+        self.cache = cache
+        self.metrics = metrics
+        self.limiter = limiter or default_limiter()
+        self.budget = budget if budget is not None else default_budget()
         self.api_key = DOUBAO_API_KEY
-        self.endpoint = DOUBAO_API_ENDPOINT
+        self.endpoint = endpoint or DOUBAO_API_ENDPOINT
         self.model = DOUBAO_MODEL
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-    
+        self.http = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=REQUEST_TIMEOUT,
+            http2=http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._inflight: Dict[str, asyncio.Task] = {}  # Prompt hash -> running generate
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def generate(self, prompt: str, validate: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        """
+        Send one prompt and return the generated text
+
+        The persistent cache is checked first; successful responses are
+        stored in it, failures are not, so they are retried on the next run.
+        Concurrent calls with the same prompt share one request: only the
+        first one goes to the API, the others await its result.
+
+        Args:
+            prompt: Fully rendered prompt
+            validate: Only responses for which this returns a truthy value
+                are cached
+
+        Returns:
+            Generated text or None if failed
+        """
+        key = prompt_key(self.model, prompt)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if self.metrics is not None:
+                    self.metrics.record_cache_hit()
+                return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            if self.metrics is not None:
+                self.metrics.record_coalesced()
+            # Shielded so a cancelled follower does not cancel the shared request
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._request_and_cache(key, prompt, validate))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await task
+
+    async def _request_and_cache(
+        self,
+        key: str,
+        prompt: str,
+        validate: Optional[Callable[[str], Any]]
+    ) -> Optional[str]:
+        text = await self._request(prompt)
+        if text and self.cache is not None and (validate is None or validate(text)):
+            self.cache.set(key, self.model, text)
+        return text
+
+    async def _request(self, prompt: str) -> Optional[str]:
+        """
+        POST one prompt with retries, bypassing the cache; records metrics
+
+        The token estimate is reserved once per prompt and carried across
+        retries. It is refunded when a 429, a 4xx or a connection error shows
+        the attempt consumed nothing, and reserved again before the next try.
+        A 200 reply without output text is retried like a 5xx.
+        """
+        payload = build_payload(self.model, prompt)
+        estimate = len(prompt) + EXPECTED_OUTPUT_TOKENS  # ~1 token per Chinese character
+        start = time.monotonic()
+        status, usage, attempt = None, {}, 0
+        reserved = False
+
+        def refund() -> None:
+            nonlocal reserved
+            if reserved:
+                self.budget.adjust(-estimate)
+                reserved = False
+
+        try:
+            for attempt in range(MAX_RETRIES):
+                retry_after = None
+                last_attempt = attempt == MAX_RETRIES - 1
+
+                if self.budget is not None and not reserved:
+                    await self.budget.acquire(estimate)
+                    reserved = True
+
+                try:
+                    async with self.limiter:
+                        response = await self.http.post(self.endpoint, json=payload)
+                    status = response.status_code
+
+                    if response.status_code == 200:
+                        self.limiter.on_success()
+                        result = response.json()
+                        usage = result.get("usage") or {}
+                        if reserved and usage.get("total_tokens") is not None:
+                            self.budget.adjust(usage["total_tokens"] - estimate)
+                        text = extract_output_text(result)
+                        if text is not None:
+                            return text
+                        # Empty or truncated reply: retry, the tokens it used stay spent
+                        reserved = False
+                        status = "empty"
+                        print(f"Warning: Could not extract text from response "
+                              f"(attempt {attempt + 1}/{MAX_RETRIES})")
+
+                    elif response.status_code == 429:  # Rate limit
+                        refund()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        self.limiter.on_overload(retry_after)
+                        print(f"Rate limited (attempt {attempt + 1}/{MAX_RETRIES}), "
+                              f"concurrency limit now {int(self.limiter.limit)}")
+
+                    elif response.status_code >= 500:
+                        print(f"API error: {response.status_code} - {response.text[:200]}")
+
+                    else:
+                        # Other 4xx errors will not succeed on retry
+                        refund()
+                        print(f"API error: {response.status_code} - {response.text}")
+                        return None
+
+                except httpx.TimeoutException:
+                    status = "timeout"
+                    self.limiter.on_overload()
+                    print(f"Request timeout (attempt {attempt + 1}/{MAX_RETRIES})")
+
+                except httpx.TransportError as e:
+                    # Connection-level failure: the request never reached the model
+                    status = "error"
+                    refund()
+                    print(f"Error calling Doubao API: {e}")
+
+                except Exception as e:
+                    status = "error"
+                    print(f"Error calling Doubao API: {e}")
+
+                if last_attempt:
+                    return None
+                await asyncio.sleep(backoff_delay(attempt, RETRY_DELAY, MAX_RETRY_DELAY, retry_after))
+
+            return None
+
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_request(
+                    time.monotonic() - start, status, attempt,
+                    usage.get("input_tokens", usage.get("prompt_tokens", 0)),
+                    usage.get("output_tokens", usage.get("completion_tokens", 0)),
+                )
+
+    async def augment_option(
+        self,
+        option_text: str,
+        context: str,
+        chosen_text: str,
+        rejected_text: str,
+        chosen_votes: int,
+        rejected_votes: int,
+        chosen_percentage: str,
+        rejected_percentage: str,
+        is_chosen: bool = True
+    ) -> Optional[str]:
+        """
+        Generate analysis for why an option is chosen or rejected
+
+        Args:
+            option_text: The option being analyzed
+            context: Job seeker's background and question
+            chosen_text: The winning option text
+            rejected_text: The losing option text
+            chosen_votes: Votes for chosen option
+            rejected_votes: Votes for rejected option
+            chosen_percentage: Percentage for chosen option
+            rejected_percentage: Percentage for rejected option
+            is_chosen: True if analyzing chosen option, False for rejected
+
+        Returns:
+            Analysis text or None if failed
+        """
+        prompt = build_prompt(
+            context=context,
+            chosen_text=chosen_text,
+            rejected_text=rejected_text,
+            chosen_votes=chosen_votes,
+            rejected_votes=rejected_votes,
+            chosen_percentage=chosen_percentage,
+            rejected_percentage=rejected_percentage,
+            is_chosen=is_chosen
+        )
+        return await self.generate(prompt)
+
+    async def augment_pair(
+        self,
+        context: str,
+        chosen_text: str,
+        rejected_text: str,
+        chosen_votes: int,
+        rejected_votes: int,
+        chosen_percentage: str,
+        rejected_percentage: str
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Generate the chosen and rejected analyses in one request
+
+        Args:
+            context: Job seeker's background and question
+            chosen_text: The winning option text
+            rejected_text: The losing option text
+            chosen_votes: Votes for chosen option
+            rejected_votes: Votes for rejected option
+            chosen_percentage: Percentage for chosen option
+            rejected_percentage: Percentage for rejected option
+
+        Returns:
+            (chosen_analysis, rejected_analysis), or None if the request
+            failed or the reply was not valid JSON
+        """
+        prompt = build_combined_prompt(
+            context, chosen_text, rejected_text,
+            chosen_votes, rejected_votes, chosen_percentage, rejected_percentage
+        )
+        return parse_combined_response(await self.generate(prompt, parse_combined_response))
+
+
+class DoubaoClient:
+    """
+    Synchronous client for interacting with Doubao API
+
+    Thread-safe: calls from any number of worker threads are scheduled on
+    one background event loop and share its connection pool. The loop is
+    started on first use and stopped by close().
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        http2: bool = HTTP2,
+        cache: Optional[AugmentationCache] = None,
+        metrics: Optional[RequestMetrics] = None,
+        endpoint: Optional[str] = None
+    ):
+        self.max_connections = max_connections
+        self.http2 = http2
+        self.cache = cache
+        self.metrics = metrics
+        self.endpoint = endpoint or DOUBAO_API_ENDPOINT
+        # Kept across close() so a reopened client starts from the learned limit
+        self.limiter = default_limiter()
+        self.budget = default_budget()
+        self.model = DOUBAO_MODEL
+        self._loop = None
+        self._thread = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="doubao-client", daemon=True)
+                thread.start()
+                # The httpx client must be created on the loop that will use it
+                self._async_client = asyncio.run_coroutine_threadsafe(
+                    self._create_async_client(), loop
+                ).result()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _create_async_client(self) -> AsyncDoubaoClient:
+        return AsyncDoubaoClient(
+            self.max_connections, self.http2, self.cache, self.limiter, self.budget,
+            self.metrics, self.endpoint
+        )
+
+    def _run(self, coro_fn, *args, **kwargs):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro_fn(*args, **kwargs), loop).result()
+
+    def generate(self, prompt: str, validate: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        """Send one fully rendered prompt; see AsyncDoubaoClient.generate"""
+        return self._run(lambda: self._async_client.generate(prompt, validate))
+
+    def augment_pair(
+        self,
+        context: str,
+        chosen_text: str,
+        rejected_text: str,
+        chosen_votes: int,
+        rejected_votes: int,
+        chosen_percentage: str,
+        rejected_percentage: str
+    ) -> Optional[Tuple[str, str]]:
+        """Generate both analyses in one request; see AsyncDoubaoClient.augment_pair"""
+        prompt = build_combined_prompt(
+            context, chosen_text, rejected_text,
+            chosen_votes, rejected_votes, chosen_percentage, rejected_percentage
+        )
+        return parse_combined_response(self.generate(prompt, parse_combined_response))
+
     def augment_option(
-        self, 
+        self,
         option_text: str,
         context: str,
         chosen_text: str,
@@ -42,7 +553,7 @@ class DoubaoClient:
     ) -> Optional[str]:
         """
         Generate analysis for why an option is chosen or rejected
-        
+
         Args:
             option_text: The option being analyzed
             context: Job seeker's background and question
@@ -53,119 +564,51 @@ class DoubaoClient:
             chosen_percentage: Percentage for chosen option
             rejected_percentage: Percentage for rejected option
             is_chosen: True if analyzing chosen option, False for rejected
-            
+
         Returns:
             Analysis text or None if failed
         """
-        from config import CHOSEN_PROMPT, REJECTED_PROMPT
-        
-        # Select appropriate prompt
-        if is_chosen:
-            prompt = CHOSEN_PROMPT.format(
-                chosen_text=chosen_text,
-                rejected_text=rejected_text,
-                context=context,
-                chosen_votes=chosen_votes,
-                rejected_votes=rejected_votes,
-                chosen_percentage=chosen_percentage,
-                rejected_percentage=rejected_percentage
-            )
-        else:
-            prompt = REJECTED_PROMPT.format(
-                chosen_text=chosen_text,
-                rejected_text=rejected_text,
-                context=context,
-                chosen_votes=chosen_votes,
-                rejected_votes=rejected_votes,
-                chosen_percentage=chosen_percentage,
-                rejected_percentage=rejected_percentage
-            )
-        
-        payload = {
-            "model": self.model,
-            "input": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = requests.post(
-                    self.endpoint,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=REQUEST_TIMEOUT
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Parse Doubao API response structure
-                    if "output" in result and len(result["output"]) > 0:
-                        # Iterate through output items to find the message with output_text
-                        for output_item in result["output"]:
-                            if output_item.get("type") == "message":
-                                content = output_item.get("content", [])
-                                for content_item in content:
-                                    if content_item.get("type") == "output_text":
-                                        text = content_item.get("text", "").strip()
-                                        if text:
-                                            return text
-                    
-                    # Fallback: try standard OpenAI-style response
-                    if "choices" in result and len(result["choices"]) > 0:
-                        return result["choices"][0].get("message", {}).get("content", "").strip()
-                    
-                    print(f"Warning: Could not extract text from response")
-                    return None
-                    
-                elif response.status_code == 429:  # Rate limit
-                    print(f"Rate limited, retrying in {RETRY_DELAY * (attempt + 1)} seconds...")
-                    time.sleep(RETRY_DELAY * (attempt + 1))
-                    continue
-                    
-                else:
-                    print(f"API error: {response.status_code} - {response.text}")
-                    if attempt < MAX_RETRIES - 1:
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    return None
-                    
-            except requests.exceptions.Timeout:
-                print(f"Request timeout (attempt {attempt + 1}/{MAX_RETRIES})")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY)
-                    continue
-                return None
-                
-            except Exception as e:
-                print(f"Error calling Doubao API: {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY)
-                    continue
-                return None
-        
-        return None
+        prompt = build_prompt(
+            context=context,
+            chosen_text=chosen_text,
+            rejected_text=rejected_text,
+            chosen_votes=chosen_votes,
+            rejected_votes=rejected_votes,
+            chosen_percentage=chosen_percentage,
+            rejected_percentage=rejected_percentage,
+            is_chosen=is_chosen
+        )
+        return self.generate(prompt)
+
+    def close(self) -> None:
+        """Close pooled connections and stop the background loop"""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._async_client
+            self._loop = self._thread = self._async_client = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 if __name__ == "__main__":
     # Test the client
     client = DoubaoClient()
-    
+
     # Test data
     context = "本人双9硕，计算机专业，想找一个稳定的工作"
     chosen_text = "华为ICT数通"
     rejected_text = "小公司开发岗"
-    
-    print(f"Testing chosen option analysis...")
+
+    print("Testing chosen option analysis...")
     result = client.augment_option(
         option_text=chosen_text,
         context=context,
@@ -178,3 +621,4 @@ if __name__ == "__main__":
         is_chosen=True
     )
     print(f"Chosen analysis: {result}")
+    client.close()
@@ -2,18 +2,29 @@
 DPO Data Preparation Pipeline
 
 Processes poll data to create DPO training dataset:
-1. Filters meaningless options
-2. Augments short texts using Doubao API (multi-threaded)
+1. Filters meaningless options and near-duplicate polls
+2. Augments short texts using Doubao API (one shared worker pool,
+   one request per pair in COMBINED_MODE)
 3. Creates chosen/rejected pairs based on votes
-4. Writes results immediately to file
+4. Streams results to a single buffered writer thread
+5. Resumes from a completion ledger on restart (--fresh starts over)
+6. Optionally processes one content-hash shard (--shard-index/--num-shards)
 """
 
 import json
+import argparse
 import threading
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from doubao_client import DoubaoClient
+from concurrent.futures import ThreadPoolExecutor, Future
+from doubao_client import DoubaoClient, build_prompt, build_combined_prompt, parse_combined_response
+from augment_cache import AugmentationCache, prompt_key
+from ledger import CompletionLedger, pair_id
+from result_writer import ResultWriter
+from possess import iter_polls
+from dedup import NearDuplicateFilter
+from metrics import RequestMetrics, ProgressReporter
+from shards import poll_shard, shard_output_path
 from config import (
     MEANINGLESS_KEYWORDS,
     MIN_VOTE_DIFFERENCE,
@@ -22,25 +33,51 @@ from config import (
     OUTPUT_FILE,
     INCLUDE_METADATA,
     MAX_WORKERS,
+    MAX_PENDING_JOBS,
     WRITE_IMMEDIATELY,
+    USE_CACHE,
+    CACHE_DB,
+    COMBINED_MODE,
+    DEDUP_POLLS,
+    METRICS_INTERVAL,
 )
 
 
+# Job kinds submitted to the shared executor
+CHOSEN = "chosen"
+REJECTED = "rejected"
+BOTH = "both"  # One combined request for the whole pair (COMBINED_MODE)
+
+
 class DPOPipeline:
     """Pipeline for preparing DPO training data from poll results"""
     
-    def __init__(self, input_file: str = "output.json"):
+    def __init__(
+        self,
+        input_file: str = "output.json",
+        use_cache: bool = USE_CACHE,
+        endpoint: Optional[str] = None
+    ):
         self.input_file = input_file
-        self.client = DoubaoClient()
-        self.augmentation_cache = {}  # Cache to avoid re-augmenting same text
+        self.cache = AugmentationCache(CACHE_DB) if use_cache else None
+        self.metrics = RequestMetrics()
+        self.client = DoubaoClient(cache=self.cache, metrics=self.metrics, endpoint=endpoint)
+        self.augmentation_cache = {}  # Prompt hash -> analysis, for this run
+        self.inflight = {}  # Prompt hash -> Future of the worker computing it
         self.cache_lock = threading.Lock()  # Thread-safe cache access
-        self.file_lock = threading.Lock()  # Thread-safe file writing
+        self.results_lock = threading.Lock()  # Results kept until the end (WRITE_IMMEDIATELY off)
         self.stats = {
             'total_examples': 0,
             'total_chosen_votes': 0,
             'total_rejected_votes': 0,
+            'combined_fallbacks': 0,
+            'failed_pairs': 0,
+            'duplicate_polls': 0,
+            'duplicate_pairs': 0,
         }
         self.stats_lock = threading.Lock()
+        self.executor = None  # Shared worker pool, alive for the whole run
+        self.dedup = None
     
     def load_poll_data(self) -> List[Dict[str, Any]]:
         """Load poll data from JSON file"""
@@ -49,6 +86,14 @@ class DPOPipeline:
         print(f"Loaded {len(data)} polls from {self.input_file}")
         return data
     
+    def iter_poll_data(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream polls straight from the raw crawl output (concatenated JSON
+        objects or JSONL, e.g. input.txt), skipping the output.json step
+        """
+        print(f"Streaming polls from {self.input_file}")
+        return iter_polls(self.input_file)
+    
     def is_meaningless_option(self, option_text: str) -> bool:
         """
         Check if an option is meaningless (e.g., "路过", "看结果")
@@ -134,88 +179,148 @@ class DPOPipeline:
         
         return pairs
     
-    def process_single_pair(
-        self, 
-        context: str, 
-        chosen: Dict[str, Any], 
+    def augment_side(
+        self,
+        context: str,
+        chosen: Dict[str, Any],
         rejected: Dict[str, Any],
-        output_file: str
-    ) -> Optional[Dict[str, Any]]:
+        is_chosen: bool
+    ) -> Optional[str]:
         """
-        Process a single chosen/rejected pair (thread-safe)
+        Generate the analysis for one side of a chosen/rejected pair (thread-safe)
         
         Args:
             context: Poll context/question
             chosen: Chosen option
             rejected: Rejected option
-            output_file: Output file path
+            is_chosen: True for the chosen side, False for the rejected side
             
         Returns:
-            DPO example dict or None if failed
+            Analysis text, or None if the API failed (not cached, so it is retried)
+        """
+        prompt = build_prompt(
+            context=context,
+            chosen_text=chosen['text'],
+            rejected_text=rejected['text'],
+            chosen_votes=chosen['votes'],
+            rejected_votes=rejected['votes'],
+            chosen_percentage=chosen['percentage'],
+            rejected_percentage=rejected['percentage'],
+            is_chosen=is_chosen
+        )
+        
+        def compute() -> Tuple[Optional[str], bool]:
+            # Checks the persistent cache before calling the API
+            analysis = self.client.generate(prompt) or None
+            return analysis, analysis is not None
+        
+        return self._single_flight(prompt_key(self.client.model, prompt), compute)
+    
+    def augment_both(
+        self,
+        context: str,
+        chosen: Dict[str, Any],
+        rejected: Dict[str, Any]
+    ) -> Optional[Tuple[str, str]]:
         """
-        # Create cache key for this specific pair
-        cache_key = f"{chosen['text']}|{rejected['text']}|{context[:50]}"
+        Generate both analyses of a pair with one combined request (thread-safe)
         
-        # Check cache for chosen analysis (thread-safe)
-        chosen_cache_key = f"chosen_{cache_key}"
-        with self.cache_lock:
-            if chosen_cache_key in self.augmentation_cache:
-                chosen_analysis = self.augmentation_cache[chosen_cache_key]
-            else:
-                chosen_analysis = None
-        
-        if chosen_analysis is None:
-            # Generate chosen analysis
-            chosen_analysis = self.client.augment_option(
-                option_text=chosen['text'],
-                context=context,
-                chosen_text=chosen['text'],
-                rejected_text=rejected['text'],
-                chosen_votes=chosen['votes'],
-                rejected_votes=rejected['votes'],
-                chosen_percentage=chosen['percentage'],
-                rejected_percentage=rejected['percentage'],
-                is_chosen=True
-            )
+        Falls back to two augment_side calls only if a reply arrived but is
+        not valid JSON. A failed request is returned as a failure so the pair
+        is retried later, rather than tripling the load during a 429 storm.
+        
+        Args:
+            context: Poll context/question
+            chosen: Chosen option
+            rejected: Rejected option
             
-            # Fallback to original if API fails
-            if not chosen_analysis:
-                chosen_analysis = f"选择{chosen['text']}的理由：获得{chosen['votes']}票（{chosen['percentage']}）"
+        Returns:
+            (chosen_analysis, rejected_analysis), or None if the API failed
+        """
+        prompt = build_combined_prompt(
+            context=context,
+            chosen_text=chosen['text'],
+            rejected_text=rejected['text'],
+            chosen_votes=chosen['votes'],
+            rejected_votes=rejected['votes'],
+            chosen_percentage=chosen['percentage'],
+            rejected_percentage=rejected['percentage']
+        )
+        
+        def compute() -> Tuple[Optional[Tuple[str, str]], bool]:
+            text = self.client.generate(prompt, parse_combined_response)
+            if not text:
+                return None, False
+            analyses = parse_combined_response(text)
+            if analyses is not None:
+                return analyses, True
             
-            # Cache result (thread-safe)
-            with self.cache_lock:
-                self.augmentation_cache[chosen_cache_key] = chosen_analysis
-        
-        # Check cache for rejected analysis (thread-safe)
-        rejected_cache_key = f"rejected_{cache_key}"
-        with self.cache_lock:
-            if rejected_cache_key in self.augmentation_cache:
-                rejected_analysis = self.augmentation_cache[rejected_cache_key]
-            else:
-                rejected_analysis = None
-        
-        if rejected_analysis is None:
-            # Generate rejected analysis
-            rejected_analysis = self.client.augment_option(
-                option_text=rejected['text'],
-                context=context,
-                chosen_text=chosen['text'],
-                rejected_text=rejected['text'],
-                chosen_votes=chosen['votes'],
-                rejected_votes=rejected['votes'],
-                chosen_percentage=chosen['percentage'],
-                rejected_percentage=rejected['percentage'],
-                is_chosen=False
+            with self.stats_lock:
+                self.stats['combined_fallbacks'] += 1
+            fallback = (
+                self.augment_side(context, chosen, rejected, True),
+                self.augment_side(context, chosen, rejected, False),
             )
+            if None in fallback:
+                return None, False
+            return fallback, False  # Only the two side prompts are cached
+        
+        return self._single_flight(prompt_key(self.client.model, prompt), compute)
+    
+    def _single_flight(self, cache_key: str, compute: Callable[[], Tuple[Any, bool]]) -> Any:
+        """
+        Return the in-memory cached value for a prompt hash, computing it at most once at a time
+        
+        The first worker to miss runs compute; workers that ask for the same
+        key while it is running wait on its Future instead of sending the same
+        request again.
+        
+        Args:
+            cache_key: prompt_key of the request
+            compute: Returns (value, cacheable)
             
-            # Fallback to original if API fails
-            if not rejected_analysis:
-                rejected_analysis = f"不选择{rejected['text']}的理由：仅获得{rejected['votes']}票（{rejected['percentage']}）"
-            
-            # Cache result (thread-safe)
+        Returns:
+            The cached or computed value
+        """
+        with self.cache_lock:
+            if cache_key in self.augmentation_cache:
+                self.metrics.record_cache_hit()
+                return self.augmentation_cache[cache_key]
+            future = self.inflight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = self.inflight[cache_key] = Future()
+        
+        if not leader:
+            self.metrics.record_coalesced()
+            return future.result()
+        
+        try:
+            value, cacheable = compute()
+        except BaseException as e:
             with self.cache_lock:
-                self.augmentation_cache[rejected_cache_key] = rejected_analysis
+                del self.inflight[cache_key]
+            future.set_exception(e)
+            raise
         
+        with self.cache_lock:
+            if cacheable:
+                self.augmentation_cache[cache_key] = value
+            del self.inflight[cache_key]
+        future.set_result(value)
+        return value
+    
+    def build_example(
+        self,
+        context: str,
+        chosen: Dict[str, Any],
+        rejected: Dict[str, Any],
+        chosen_analysis: str,
+        rejected_analysis: str,
+        poll_index: Optional[int] = None,
+        pair_index: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Assemble a DPO training example from both analyses"""
         example = {
             "prompt": context,
             "chosen": chosen_analysis,
@@ -226,128 +331,293 @@ class DPOPipeline:
         
         if INCLUDE_METADATA:
             example["metadata"] = {
+                "pair_id": pair_id(context, chosen['text'], rejected['text']),
                 "original_chosen": chosen['text'],
                 "original_rejected": rejected['text'],
                 "chosen_percentage": chosen['percentage'],
                 "rejected_percentage": rejected['percentage'],
             }
+            if poll_index is not None:
+                # Input position, used by shards.py to restore a global order
+                example["metadata"]["poll_index"] = poll_index
+                example["metadata"]["pair_index"] = pair_index
+        
+        return example
+    
+    def _submit(self, job: "_PairJob", side: str) -> None:
+        """Submit one side (or both) of a pair, blocking while too many jobs are in flight"""
+        self._slots.acquire()
+        try:
+            if side == BOTH:
+                future = self.executor.submit(self.augment_both, job.context, job.chosen, job.rejected)
+            else:
+                future = self.executor.submit(
+                    self.augment_side, job.context, job.chosen, job.rejected, side == CHOSEN
+                )
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._on_job_done(job, side, f))
+    
+    def _on_job_done(self, job: "_PairJob", side: str, future: Future) -> None:
+        """
+        Executor callback: store the result and finish the pair when both sides are ready
+        
+        A pair with a failed side (API gave up, or an exception) is neither
+        written nor added to the ledger, so the next run retries it.
+        """
+        self._slots.release()
+        
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error processing pair: {e}")
+            result = None
+        
+        if not job.set_result(side, result):
+            return
+        
+        try:
+            if job.failed:
+                with self.stats_lock:
+                    self.stats['failed_pairs'] += 1
+            else:
+                self._finish_pair(job)
+        except Exception as e:
+            print(f"Error writing pair: {e}")
+        finally:
+            self.progress.pair_done(job.poll_index)
+    
+    def _finish_pair(self, job: "_PairJob") -> None:
+        """Write the finished example and update statistics (thread-safe)"""
+        example = self.build_example(
+            job.context, job.chosen, job.rejected, job.chosen_analysis, job.rejected_analysis,
+            job.poll_index, job.pair_index
+        )
         
-        # Write immediately to file (thread-safe)
         if WRITE_IMMEDIATELY:
-            with self.file_lock:
-                with open(output_file, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(example, ensure_ascii=False) + '\n')
+            # The writer records the pair id in the ledger once the example is flushed
+            self.writer.write(example, job.pair_id)
+        else:
+            with self.results_lock:
+                self.results.append(((job.poll_index, job.pair_index), job.pair_id, example))
         
-        # Update statistics (thread-safe)
         with self.stats_lock:
             self.stats['total_examples'] += 1
-            self.stats['total_chosen_votes'] += chosen['votes']
-            self.stats['total_rejected_votes'] += rejected['votes']
-        
-        return example
+            self.stats['total_chosen_votes'] += job.chosen['votes']
+            self.stats['total_rejected_votes'] += job.rejected['votes']
+        self.metrics.record_pair()
     
-    def process_poll(self, poll: Dict[str, Any], poll_index: int, total_polls: int, output_file: str) -> List[Dict[str, Any]]:
+    def schedule_poll(
+        self,
+        poll: Dict[str, Any],
+        poll_index: int,
+        shard_index: int = 0,
+        num_shards: int = 1
+    ) -> int:
         """
-        Process a single poll to create DPO training examples (multi-threaded)
+        Queue every (pair, side) job of a poll on the shared executor
+        
+        Near-duplicate detection sees every poll before the shard check, so
+        all shards drop the same polls as an unsharded run would.
         
         Args:
             poll: Poll data
-            poll_index: Index of current poll
-            total_polls: Total number of polls
-            output_file: Output file path
+            poll_index: Index of the poll in the input
+            shard_index: Shard handled by this run
+            num_shards: Total number of shards
             
         Returns:
-            List of DPO training examples
+            Number of pairs scheduled (pairs in the ledger are skipped)
         """
-        pairs = self.create_dpo_pairs(poll)
-        
-        if not pairs:
-            return []
+        duplicate = self.dedup is not None and self.dedup.is_duplicate(poll)
+        if num_shards > 1 and poll_shard(poll, num_shards) != shard_index:
+            self.progress.add_poll(poll_index, 0, hidden=True)
+            return 0
+        
+        if duplicate:
+            num_pairs = len(self.create_dpo_pairs(poll))
+            with self.stats_lock:
+                self.stats['duplicate_polls'] += 1
+                self.stats['duplicate_pairs'] += num_pairs
+            self.progress.add_poll(poll_index, 0, note="near-duplicate of an earlier poll, skipped")
+            return 0
         
         context = poll.get('content', '').strip()
-        examples = []
-        
-        # Process pairs concurrently
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = []
-            for chosen, rejected in pairs:
-                future = executor.submit(
-                    self.process_single_pair,
-                    context,
-                    chosen,
-                    rejected,
-                    output_file
-                )
-                futures.append(future)
-            
-            # Collect results
-            for future in as_completed(futures):
-                try:
-                    example = future.result()
-                    if example:
-                        examples.append(example)
-                except Exception as e:
-                    print(f"Error processing pair: {e}")
-        
-        return examples
+        jobs = []
+        skipped = 0
+        for pair_index, (chosen, rejected) in enumerate(self.create_dpo_pairs(poll)):
+            job = _PairJob(poll_index, pair_index, context, chosen, rejected)
+            if job.pair_id in self.ledger:
+                skipped += 1
+                continue
+            jobs.append(job)
+        
+        self.skipped_pairs += skipped
+        self.progress.add_poll(poll_index, len(jobs), skipped)
+        for job in jobs:
+            if COMBINED_MODE:
+                self._submit(job, BOTH)
+            else:
+                self._submit(job, CHOSEN)
+                self._submit(job, REJECTED)
+        
+        return len(jobs)
     
-    def run(self, output_file: Optional[str] = None) -> None:
+    def run(
+        self,
+        output_file: Optional[str] = None,
+        fresh: bool = False,
+        shard_index: int = 0,
+        num_shards: int = 1
+    ) -> None:
         """
-        Run the full DPO pipeline with multi-threading
+        Run the full DPO pipeline on one long-lived worker pool
+        
+        Every (poll, pair, side) job goes to the same executor (one job per
+        pair in COMBINED_MODE), so all MAX_WORKERS API slots stay busy across
+        poll boundaries. Submission
+        blocks once MAX_PENDING_JOBS are in flight, and progress is still
+        reported in poll order.
+        
+        Unless fresh is set, pairs recorded in the completion ledger
+        ({output_file}.ledger) or already present in the output are skipped
+        and new examples are appended.
+        
+        With num_shards > 1 only the polls whose content hashes to
+        shard_index are processed, and output, ledger and metrics go to
+        the shard's own files (see shards.py for merging them).
         
         Args:
             output_file: Output file path (default from config)
+            fresh: Discard existing output and ledger and start over
+            shard_index: Shard handled by this run
+            num_shards: Total number of shards
         """
         if output_file is None:
             output_file = OUTPUT_FILE
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+        if num_shards > 1:
+            output_file = shard_output_path(output_file, shard_index, num_shards)
+        self.output_file = output_file
         
         print("=" * 60)
         print("DPO Data Preparation Pipeline (Multi-threaded)")
         print("=" * 60)
         print(f"Max workers: {MAX_WORKERS}")
+        print(f"Max pending jobs: {MAX_PENDING_JOBS}")
+        print(f"Combined mode: {COMBINED_MODE}")
         print(f"Write immediately: {WRITE_IMMEDIATELY}")
+        if num_shards > 1:
+            print(f"Shard: {shard_index} of {num_shards} -> {output_file}")
         print("=" * 60)
         
-        # Clear output file if writing immediately
-        if WRITE_IMMEDIATELY:
-            with open(output_file, 'w', encoding='utf-8') as f:
+        self.ledger = CompletionLedger(f"{output_file}.ledger")
+        self.skipped_pairs = 0
+        if fresh:
+            with open(output_file, 'wb'):
                 pass  # Clear file
-        
-        # Load data
-        polls = self.load_poll_data()
-        
-        # Process polls
-        all_examples = []
-        
-        for i, poll in enumerate(polls):
-            print(f"\nProcessing poll {i + 1}/{len(polls)}...")
-            examples = self.process_poll(poll, i, len(polls), output_file)
+            self.ledger.reset()
+        else:
+            finished = self.ledger.load(output_file)
+            print(f"Resuming: {finished} pair(s) already in {output_file}")
+        
+        # Load data: a prepared JSON array, or raw records decoded as they are read
+        if self.input_file.endswith('.json'):
+            polls = self.load_poll_data()
+            total_polls = len(polls)
+        else:
+            polls = self.iter_poll_data()
+            total_polls = None
+        
+        self.results = []
+        self.dedup = NearDuplicateFilter() if DEDUP_POLLS else None
+        self.progress = _PollProgress(total_polls)
+        self._slots = threading.BoundedSemaphore(max(MAX_PENDING_JOBS, 2))
+        self.writer = ResultWriter(
+            output_file, on_flush=self.ledger.add_many, on_checkpoint=self.ledger.sync
+        )
+        self.metrics = self.client.metrics = RequestMetrics()
+        reporter = ProgressReporter(
+            self.metrics, METRICS_INTERVAL,
+            extra=lambda: {"concurrency": int(self.client.limiter.limit)}
+        )
+        reporter.start()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                self.executor = executor
+                for i, poll in enumerate(polls):
+                    self.schedule_poll(poll, i, shard_index, num_shards)
+            self.executor = None
             
-            if examples:
-                print(f"  Generated {len(examples)} DPO pair(s)")
-                if not WRITE_IMMEDIATELY:
-                    all_examples.extend(examples)
-            else:
-                print(f"  No valid pairs found")
-        
-        # Save results if not writing immediately
-        if not WRITE_IMMEDIATELY:
-            print(f"\n{'=' * 60}")
-            print(f"Saving to {output_file}...")
+            if self.skipped_pairs:
+                print(f"Skipped {self.skipped_pairs} pair(s) finished in a previous run")
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for example in all_examples:
-                    f.write(json.dumps(example, ensure_ascii=False) + '\n')
+            # Save results if not writing immediately (in input order)
+            if not WRITE_IMMEDIATELY:
+                print(f"\n{'=' * 60}")
+                print(f"Saving to {output_file}...")
+                
+                for _, pid, example in sorted(self.results, key=lambda item: item[0]):
+                    self.writer.write(example, pid)
+        finally:
+            # Flush and fsync whatever finished, even on Ctrl-C, so a rerun resumes from it
+            reporter.stop()
+            self.client.close()
+            self.writer.close()
+            self.ledger.close()
+            self.save_metrics(f"{output_file}.metrics.json")
         
         # Final statistics
         print(f"\n{'=' * 60}")
         print(f"✓ Processing complete!")
         print(f"Total DPO examples generated: {self.stats['total_examples']}")
+        if self.stats['failed_pairs']:
+            print(f"Pairs that failed and will be retried on the next run: {self.stats['failed_pairs']}")
         print(f"Output file: {output_file}")
         print("=" * 60)
         
         # Statistics
         self._print_statistics()
+        self._print_metrics()
+    
+    def save_metrics(self, path: str) -> Dict[str, Any]:
+        """Write the request metrics and pipeline counters as a JSON report"""
+        limiter = self.client.limiter
+        with self.stats_lock:
+            stats = dict(self.stats)
+        self.report = self.metrics.save(
+            path,
+            concurrency_limit=int(limiter.limit),
+            overloads=limiter.overloads,
+            skipped_pairs=getattr(self, 'skipped_pairs', 0),
+            **stats,
+        )
+        self.report_path = path
+        return self.report
+    
+    def _print_metrics(self) -> None:
+        """Print request latency, throughput, token usage and spend"""
+        report = self.report
+        latency = report['latency_seconds']
+        
+        print("\nRequest Metrics:")
+        print("-" * 60)
+        print(f"Throughput: {report['pairs_per_minute']:.1f} pairs/min, "
+              f"{report['requests_per_minute']:.1f} requests/min")
+        print(f"Requests: {report['requests']} (status {report['status_counts']}, "
+              f"retries {report['retries']})")
+        if latency['p50'] is not None:
+            print(f"Latency: p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, "
+                  f"p99 {latency['p99']:.2f}s, max {latency['max']:.2f}s")
+        print(f"Tokens: {report['input_tokens']} in / {report['output_tokens']} out, "
+              f"estimated spend {report['estimated_cost']:.2f}")
+        print(f"Cache hit ratio: {report['cache_hit_ratio']:.1%}, "
+              f"{report['coalesced']} duplicate in-flight request(s) coalesced")
+        print(f"Report: {self.report_path}")
+        print("-" * 60)
     
     def _print_statistics(self) -> None:
         """Print statistics about the generated dataset"""
@@ -371,13 +641,142 @@ class DPOPipeline:
         with self.cache_lock:
             print(f"Unique analyses cached: {len(self.augmentation_cache)}")
         
+        if DEDUP_POLLS:
+            calls_per_pair = 1 if COMBINED_MODE else 2
+            print(f"Near-duplicate polls skipped: {self.stats['duplicate_polls']} "
+                  f"({self.stats['duplicate_pairs']} pair(s), "
+                  f"~{self.stats['duplicate_pairs'] * calls_per_pair} API call(s) saved)")
+        
+        if COMBINED_MODE:
+            print(f"Combined requests that fell back to two calls: {self.stats['combined_fallbacks']}")
+        
+        limiter = self.client.limiter
+        print(f"Concurrency limit: {int(limiter.limit)} (429/timeout backoffs: {limiter.overloads})")
+        
+        if self.cache is not None:
+            total = self.cache.hits + self.cache.misses
+            print(f"Persistent cache hits: {self.cache.hits}/{total} ({CACHE_DB})")
+        
         print("-" * 60)
 
 
+class _PairJob:
+    """Both sides of one chosen/rejected pair; completed when both analyses arrive"""
+    
+    def __init__(self, poll_index: int, pair_index: int, context: str,
+                 chosen: Dict[str, Any], rejected: Dict[str, Any]):
+        self.poll_index = poll_index
+        self.pair_index = pair_index
+        self.context = context
+        self.chosen = chosen
+        self.rejected = rejected
+        self.pair_id = pair_id(context, chosen['text'], rejected['text'])
+        self.chosen_analysis = None
+        self.rejected_analysis = None
+        self.failed = False  # Some side got no analysis from the API
+        self._remaining = 2
+        self._lock = threading.Lock()
+    
+    def set_result(self, side: str, result) -> bool:
+        """Store one side's analysis (or both); returns True for the call that completes the pair"""
+        with self._lock:
+            if result is None:
+                self.failed = True
+                self._remaining -= 2 if side == BOTH else 1
+            elif side == BOTH:
+                self.chosen_analysis, self.rejected_analysis = result
+                self._remaining -= 2
+            elif side == CHOSEN:
+                self.chosen_analysis = result
+                self._remaining -= 1
+            else:
+                self.rejected_analysis = result
+                self._remaining -= 1
+            return self._remaining == 0
+
+
+class _PollProgress:
+    """
+    Reports finished polls strictly in input order
+    
+    Pairs finish out of order on the shared executor; a poll is printed once
+    all of its pairs and all earlier polls are done.
+    """
+    
+    def __init__(self, total_polls: Optional[int] = None):
+        self.total_polls = total_polls
+        self.pending = {}  # poll index -> pairs not yet finished
+        self.num_pairs = {}
+        self.skipped = {}
+        self.notes = {}
+        self.hidden = set()
+        self.next_index = 0
+        self.lock = threading.Lock()
+    
+    def add_poll(
+        self,
+        poll_index: int,
+        num_pairs: int,
+        skipped: int = 0,
+        note: Optional[str] = None,
+        hidden: bool = False
+    ) -> None:
+        """hidden: Count the poll without printing it (polls of other shards)"""
+        with self.lock:
+            self.pending[poll_index] = num_pairs
+            self.num_pairs[poll_index] = num_pairs
+            self.skipped[poll_index] = skipped
+            self.notes[poll_index] = note
+            if hidden:
+                self.hidden.add(poll_index)
+            self._report_ready()
+    
+    def pair_done(self, poll_index: int) -> None:
+        with self.lock:
+            self.pending[poll_index] -= 1
+            self._report_ready()
+    
+    def _label(self, i: int) -> str:
+        return f"{i + 1}/{self.total_polls}" if self.total_polls else str(i + 1)
+    
+    def _report_ready(self) -> None:
+        while self.pending.get(self.next_index) == 0:
+            i = self.next_index
+            del self.pending[i]
+            num_pairs = self.num_pairs.pop(i)
+            skipped = self.skipped.pop(i)
+            note = self.notes.pop(i)
+            if i in self.hidden:
+                self.hidden.discard(i)
+            elif note:
+                print(f"Poll {self._label(i)}: {note}")
+            elif num_pairs:
+                print(f"Poll {self._label(i)}: generated {num_pairs} DPO pair(s)")
+            elif skipped:
+                print(f"Poll {self._label(i)}: {skipped} pair(s) already done")
+            else:
+                print(f"Poll {self._label(i)}: no valid pairs found")
+            self.next_index += 1
+
+
 def main():
     """Main entry point"""
-    pipeline = DPOPipeline()
-    pipeline.run()
+    parser = argparse.ArgumentParser(description="Build a DPO dataset from poll data")
+    parser.add_argument("--input", default="output.json",
+                        help="Poll data JSON array, or raw crawl output (input.txt / JSONL) to stream")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Output JSONL file")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Discard existing output and ledger instead of resuming")
+    parser.add_argument("--num-shards", type=int, default=1,
+                        help="Split polls across this many machines by content hash")
+    parser.add_argument("--shard-index", type=int, default=0,
+                        help="Shard handled by this run (0 .. num-shards - 1)")
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard-index must be between 0 and --num-shards - 1")
+    
+    pipeline = DPOPipeline(args.input)
+    pipeline.run(args.output, fresh=args.fresh, shard_index=args.shard_index, num_shards=args.num_shards)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+"""
+Export the DPO dataset for training
+
+Converts dpo_dataset.jsonl (plain or .zst) into columnar train/eval files
+with a fixed schema, so trainers no longer re-parse JSON every epoch:
+
+    dpo_export/train.arrow, dpo_export/eval.arrow   (EXPORT_FORMAT = "arrow")
+    dpo_export/train.parquet, dpo_export/eval.parquet
+
+Arrow IPC files are loaded with a memory map and no copy (load_split);
+Parquet is smaller on disk but is decoded on load.
+
+Each pair goes to eval when a hash of its pair id falls below EVAL_RATIO, so
+the split is deterministic and stays the same as the dataset grows or is
+regenerated. With --tokenizer, prompt/chosen/rejected are also stored as
+token id lists (plain text, no special tokens or chat template), and the
+tokenizer name is recorded in the schema metadata.
+
+Usage:
+    python export_dataset.py --input dpo_dataset.jsonl --output-dir dpo_export
+    python export_dataset.py --format parquet --tokenizer Qwen/Qwen2.5-7B-Instruct
+"""
+
+import os
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from config import (
+    OUTPUT_FILE,
+    EXPORT_DIR,
+    EXPORT_FORMAT,
+    EVAL_RATIO,
+    EXPORT_BATCH_SIZE,
+)
+from result_writer import iter_jsonl
+from shards import example_key
+
+SCHEMA_VERSION = "1"
+SPLITS = ("train", "eval")
+TEXT_COLUMNS = ("prompt", "chosen", "rejected")
+EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Export needs the pyarrow package: pip install pyarrow")
+
+
+def build_schema(tokenizer_name: Optional[str] = None, eval_ratio: float = EVAL_RATIO) -> "pa.Schema":
+    """Fixed export schema; token id columns are added when a tokenizer is used"""
+    _require_pyarrow()
+    fields = [
+        pa.field("pair_id", pa.string(), nullable=False),
+        pa.field("prompt", pa.string(), nullable=False),
+        pa.field("chosen", pa.string(), nullable=False),
+        pa.field("rejected", pa.string(), nullable=False),
+        pa.field("chosen_votes", pa.int32()),
+        pa.field("rejected_votes", pa.int32()),
+        pa.field("original_chosen", pa.string()),
+        pa.field("original_rejected", pa.string()),
+        pa.field("chosen_percentage", pa.string()),
+        pa.field("rejected_percentage", pa.string()),
+        pa.field("poll_index", pa.int64()),
+        pa.field("pair_index", pa.int32()),
+    ]
+    if tokenizer_name:
+        fields += [pa.field(f"{column}_input_ids", pa.list_(pa.int32())) for column in TEXT_COLUMNS]
+
+    metadata = {"dpo_export_version": SCHEMA_VERSION, "eval_ratio": str(eval_ratio)}
+    if tokenizer_name:
+        metadata["tokenizer"] = tokenizer_name
+    return pa.schema(fields, metadata=metadata)
+
+
+def example_split(key: str, eval_ratio: float = EVAL_RATIO) -> str:
+    """"train" or "eval", from a hash of the pair id (independent of file order)"""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return "eval" if int.from_bytes(digest[:8], "big") / 2 ** 64 < eval_ratio else "train"
+
+
+def example_row(example: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """Flatten one JSONL example (with or without metadata) into a schema row"""
+    metadata = example.get("metadata") or {}
+    return {
+        "pair_id": key,
+        "prompt": example["prompt"],
+        "chosen": example["chosen"],
+        "rejected": example["rejected"],
+        "chosen_votes": example.get("chosen_votes"),
+        "rejected_votes": example.get("rejected_votes"),
+        "original_chosen": metadata.get("original_chosen"),
+        "original_rejected": metadata.get("original_rejected"),
+        "chosen_percentage": metadata.get("chosen_percentage"),
+        "rejected_percentage": metadata.get("rejected_percentage"),
+        "poll_index": metadata.get("poll_index"),
+        "pair_index": metadata.get("pair_index"),
+    }
+
+
+def load_tokenizer(name: str):
+    """Load a Hugging Face tokenizer (transformers is only needed for --tokenizer)"""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError("--tokenizer needs the transformers package: pip install transformers")
+    return AutoTokenizer.from_pretrained(name)
+
+
+def split_path(output_dir: str, split: str, fmt: str = EXPORT_FORMAT) -> str:
+    return os.path.join(output_dir, split + EXTENSIONS[fmt])
+
+
+class _SplitWriter:
+    """Buffers rows of one split and writes them as record batches"""
+
+    def __init__(self, path: str, fmt: str, schema: "pa.Schema", batch_size: int, tokenizer=None):
+        self.path = path
+        self.schema = schema
+        self.batch_size = batch_size
+        self.tokenizer = tokenizer
+        self.rows: List[Dict[str, Any]] = []
+        self.written = 0
+        if fmt == "parquet":
+            self.writer = pq.ParquetWriter(path, schema)
+        else:
+            self.writer = pa.ipc.new_file(path, schema)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        if self.tokenizer is not None:
+            for column in TEXT_COLUMNS:
+                texts = [row[column] for row in self.rows]
+                ids = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+                for row, row_ids in zip(self.rows, ids):
+                    row[f"{column}_input_ids"] = row_ids
+        self.writer.write_batch(pa.RecordBatch.from_pylist(self.rows, schema=self.schema))
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.close()
+
+
+def export_dataset(
+    input_file: str = OUTPUT_FILE,
+    output_dir: str = EXPORT_DIR,
+    fmt: str = EXPORT_FORMAT,
+    eval_ratio: float = EVAL_RATIO,
+    tokenizer_name: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Stream a DPO JSONL file into train/eval Arrow or Parquet files
+
+    Args:
+        input_file: DPO JSONL output (plain or .zst)
+        output_dir: Directory for {split}.arrow / {split}.parquet
+        fmt: "arrow" or "parquet"
+        eval_ratio: Fraction of pairs assigned to eval
+        tokenizer_name: Hugging Face tokenizer for the *_input_ids columns
+        batch_size: Rows per record batch / row group
+
+    Returns:
+        Rows written per split, plus duplicates skipped
+    """
+    _require_pyarrow()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    schema = build_schema(tokenizer_name, eval_ratio)
+    tokenizer = load_tokenizer(tokenizer_name) if tokenizer_name else None
+    writers = {
+        split: _SplitWriter(split_path(output_dir, split, fmt), fmt, schema, batch_size, tokenizer)
+        for split in SPLITS
+    }
+
+    seen = set()
+    duplicates = 0
+    try:
+        for example in iter_jsonl(input_file):
+            key = example_key(example)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            writers[example_split(key, eval_ratio)].add(example_row(example, key))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    counts = {split: writer.written for split, writer in writers.items()}
+    counts["duplicates"] = duplicates
+    return counts
+
+
+def load_split(path: str) -> "pa.Table":
+    """
+    Load an exported split
+
+    Arrow IPC files are memory-mapped and read without copying, so loading
+    is near-instant and the pages are shared between dataloader workers.
+    """
+    _require_pyarrow()
+    if path.endswith(EXTENSIONS["parquet"]):
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the DPO dataset to Arrow/Parquet train/eval files")
+    parser.add_argument("--input", default=OUTPUT_FILE, help="DPO JSONL file (plain or .zst)")
+    parser.add_argument("--output-dir", default=EXPORT_DIR, help="Directory for the split files")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default=EXPORT_FORMAT)
+    parser.add_argument("--eval-ratio", type=float, default=EVAL_RATIO, help="Fraction of pairs in eval")
+    parser.add_argument("--tokenizer", default=None,
+                        help="Hugging Face tokenizer name/path; adds *_input_ids columns")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Rows per batch")
+    args = parser.parse_args()
+
+    counts = export_dataset(args.input, args.output_dir, args.format, args.eval_ratio,
+                            args.tokenizer, args.batch_size)
+
+    print(f"Exported {counts['train']} train / {counts['eval']} eval example(s) "
+          f"({counts['duplicates']} duplicate(s) skipped)")
+    for split in SPLITS:
+        path = split_path(args.output_dir, split, args.format)
+        table = load_split(path)
+        print(f"{path}: {table.num_rows} rows, {os.path.getsize(path) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
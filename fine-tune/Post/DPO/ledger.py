@@ -0,0 +1,109 @@
+"""
+Completion ledger for resumable DPO generation
+
+Every finished pair is identified by a hash of the poll content and the
+chosen/rejected option texts. Ids are appended to a sidecar file next to
+the output ({output}.ledger) after the example itself has been written,
+so on restart the pipeline schedules only the pairs that are missing.
+The ResultWriter records ids right after each flush of the output.
+"""
+
+import os
+import hashlib
+from typing import Iterator, Optional
+
+from result_writer import iter_jsonl, repair_tail, truncate_partial_line
+
+
+def pair_id(context: str, chosen_text: str, rejected_text: str) -> str:
+    """Stable id of a (poll, chosen, rejected) pair"""
+    raw = "\0".join([context, chosen_text, rejected_text])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def example_pair_id(example: dict) -> Optional[str]:
+    """Recover the pair id of a written example (None without metadata)"""
+    metadata = example.get("metadata")
+    if not metadata:
+        return None
+    if "pair_id" in metadata:
+        return metadata["pair_id"]
+    return pair_id(example["prompt"], metadata["original_chosen"], metadata["original_rejected"])
+
+
+def iter_output_pair_ids(output_file: str) -> Iterator[str]:
+    """Pair ids of the examples already in an output JSONL file (plain or .zst)"""
+    for example in iter_jsonl(output_file):
+        try:
+            pid = example_pair_id(example)
+        except KeyError:
+            continue
+        if pid:
+            yield pid
+
+
+class CompletionLedger:
+    """Set of finished pair ids backed by an append-only sidecar file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self._file = None
+
+    def load(self, output_file: Optional[str] = None) -> int:
+        """
+        Read finished ids from the ledger and, when given, the output file
+
+        Examples written just before a crash may be missing from the
+        ledger; scanning the output adds them back so they are not
+        generated twice.
+
+        Returns:
+            Number of finished pairs
+        """
+        if os.path.exists(self.path):
+            truncate_partial_line(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.done.update(line.strip() for line in f if line.strip())
+
+        if output_file and os.path.exists(output_file):
+            repair_tail(output_file)
+            missing = [pid for pid in iter_output_pair_ids(output_file) if pid not in self.done]
+            self.add_many(missing)
+
+        return len(self.done)
+
+    def reset(self) -> None:
+        """Forget all finished pairs (used by --fresh)"""
+        self.close()
+        self.done = set()
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self.done
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    def add(self, pid: str) -> None:
+        self.add_many([pid])
+
+    def add_many(self, pids) -> None:
+        if not pids:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(f"{pid}\n" for pid in pids))
+        self._file.flush()
+        self.done.update(pids)
+
+    def sync(self) -> None:
+        """fsync the ledger file (called at writer checkpoints)"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
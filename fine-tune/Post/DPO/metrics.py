@@ -0,0 +1,164 @@
+"""
+Request metrics for the DPO pipeline
+
+RequestMetrics records one entry per DoubaoClient request: latency (including
+retries), final HTTP status, retry count and the token usage reported by the
+Responses API. It also counts cache hits and finished pairs. From these it
+derives throughput, latency percentiles, estimated spend and cache hit
+ratio, shown in a periodic progress line and written as a final JSON report.
+"""
+
+import json
+import time
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from config import PRICE_PER_M_INPUT_TOKENS, PRICE_PER_M_OUTPUT_TOKENS
+
+
+def percentile(sorted_values, q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(int(q / 100.0 * len(sorted_values)), len(sorted_values) - 1)
+    return round(sorted_values[index], 3)
+
+
+class RequestMetrics:
+    """Thread-safe collector shared by the client and the pipeline"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies = []
+        self.statuses = Counter()
+        self.requests = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.pairs = 0
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        latency: float,
+        status: Any,
+        retries: int,
+        input_tokens: int = 0,
+        output_tokens: int = 0
+    ) -> None:
+        """
+        Record one API request
+
+        Args:
+            latency: Seconds from first attempt to final outcome
+            status: Final HTTP status code, or "timeout"/"error"
+            retries: Attempts after the first one
+            input_tokens: usage.input_tokens of the successful response
+            output_tokens: usage.output_tokens of the successful response
+        """
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            self.statuses[str(status)] += 1
+            self.retries += retries
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def record_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_coalesced(self) -> None:
+        """A call that waited for an identical in-flight request instead of sending its own"""
+        with self._lock:
+            self.coalesced += 1
+
+    def record_pair(self) -> None:
+        with self._lock:
+            self.pairs += 1
+
+    def estimated_cost(self) -> float:
+        return (self.input_tokens * PRICE_PER_M_INPUT_TOKENS
+                + self.output_tokens * PRICE_PER_M_OUTPUT_TOKENS) / 1e6
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current totals and derived rates"""
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            latencies = sorted(self.latencies)
+            lookups = self.cache_hits + self.requests
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "pairs": self.pairs,
+                "pairs_per_minute": round(self.pairs / elapsed * 60, 2) if elapsed else 0.0,
+                "requests": self.requests,
+                "requests_per_minute": round(self.requests / elapsed * 60, 2) if elapsed else 0.0,
+                "status_counts": dict(self.statuses),
+                "retries": self.retries,
+                "latency_seconds": {
+                    "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    "p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99),
+                    "max": round(latencies[-1], 3) if latencies else None,
+                },
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "estimated_cost": round(self.estimated_cost(), 4),
+                "cache_hits": self.cache_hits,
+                "cache_hit_ratio": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.coalesced,
+            }
+
+    def progress_line(self, **extra: Any) -> str:
+        s = self.snapshot()
+        lat = s["latency_seconds"]
+        p50 = f"{lat['p50']:.1f}s" if lat["p50"] is not None else "-"
+        p95 = f"{lat['p95']:.1f}s" if lat["p95"] is not None else "-"
+        line = (f"[{s['elapsed_seconds']:.0f}s] pairs {s['pairs']} ({s['pairs_per_minute']:.1f}/min) | "
+                f"requests {s['requests']} p50 {p50} p95 {p95} | "
+                f"429s {s['status_counts'].get('429', 0)} retries {s['retries']} | "
+                f"tokens {s['input_tokens']}/{s['output_tokens']} ~{s['estimated_cost']:.2f} | "
+                f"cache {s['cache_hit_ratio']:.0%}")
+        for key, value in extra.items():
+            line += f" | {key} {value}"
+        return line
+
+    def save(self, path: str, **extra: Any) -> Dict[str, Any]:
+        """Write the final JSON report"""
+        report = dict(self.snapshot(), **extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+
+class ProgressReporter:
+    """Background thread printing RequestMetrics.progress_line every interval seconds"""
+
+    def __init__(self, metrics: RequestMetrics, interval: float,
+                 extra: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.extra = extra
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            extra = self.extra() if self.extra else {}
+            print(self.metrics.progress_line(**extra), flush=True)
@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Ark Responses API
+
+A small asyncio HTTP/1.1 server (keep-alive, no extra dependencies) that
+answers POSTs the way DoubaoClient expects. It can inject:
+  - latency drawn from a fixed, uniform or lognormal distribution
+  - 429s at a given rate, and/or whenever more than --max-concurrency
+    requests are in flight (with a Retry-After header)
+  - malformed responses (broken JSON, or a 200 without output text)
+
+Prompts asking for the combined JSON reply get a valid
+{"chosen": ..., "rejected": ...} object, so both pipeline modes can be
+exercised offline.
+
+Usage:
+    python mock_ark_server.py --port 8000 --latency lognormal --latency-mean 1.5 --rate-429 0.02
+    # then point DOUBAO_API_ENDPOINT at http://127.0.0.1:8000/api/v3/responses
+"""
+
+import json
+import random
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests"}
+
+
+class MockArkServer:
+    """
+    Args:
+        latency: "fixed", "uniform" or "lognormal"
+        latency_mean: Mean latency in seconds
+        latency_sigma: Spread; half-width for uniform, log-space sigma for lognormal
+        rate_429: Probability of answering 429 regardless of load
+        max_concurrency: Answer 429 when more requests are in flight (0 = unlimited)
+        retry_after: Retry-After seconds sent with 429s (None = omit header)
+        malformed_rate: Probability of a malformed 200 response
+        seed: Random seed for reproducible runs
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "lognormal",
+        latency_mean: float = 1.0,
+        latency_sigma: float = 0.5,
+        rate_429: float = 0.0,
+        max_concurrency: int = 0,
+        retry_after: Optional[float] = 1.0,
+        malformed_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+
+        self.in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "malformed": 0, "peak_in_flight": 0}
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    # ---- responses ----
+
+    def _sample_latency(self) -> float:
+        if self.latency == "fixed":
+            return self.latency_mean
+        if self.latency == "uniform":
+            return max(self.rng.uniform(self.latency_mean - self.latency_sigma,
+                                        self.latency_mean + self.latency_sigma), 0.0)
+        # lognormal with the requested mean
+        mu = -0.5 * self.latency_sigma ** 2
+        return self.latency_mean * self.rng.lognormvariate(mu, self.latency_sigma)
+
+    def _respond(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], bytes]:
+        try:
+            prompt = body["input"][0]["content"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return 400, {}, b'{"error": {"message": "invalid input"}}'
+
+        if self.rng.random() < self.malformed_rate:
+            self.stats["malformed"] += 1
+            if self.rng.random() < 0.5:
+                return 200, {}, b'{"output": [{"type": "message", "content": [{"type": "output_te'
+            return 200, {}, json.dumps({"output": [], "usage": {}}).encode("utf-8")
+
+        if '"chosen"' in prompt and '"rejected"' in prompt:
+            text = json.dumps({
+                "chosen": "（模拟）推荐理由：" + prompt[-40:],
+                "rejected": "（模拟）不推荐理由：" + prompt[-40:],
+            }, ensure_ascii=False)
+        else:
+            text = "（模拟）分析：" + prompt[-80:]
+
+        result = {
+            "id": f"resp_mock_{self.stats['requests']}",
+            "object": "response",
+            "model": body.get("model"),
+            "output": [{
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text}],
+            }],
+            "usage": {
+                "input_tokens": len(prompt),
+                "output_tokens": len(text),
+                "total_tokens": len(prompt) + len(text),
+            },
+        }
+        self.stats["ok"] += 1
+        return 200, {}, json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+    async def _handle_request(self, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        self.stats["requests"] += 1
+        overloaded = self.max_concurrency and self.in_flight >= self.max_concurrency
+        if overloaded or self.rng.random() < self.rate_429:
+            self.stats["rate_limited"] += 1
+            headers = {} if self.retry_after is None else {"Retry-After": str(self.retry_after)}
+            return 429, headers, b'{"error": {"code": "RateLimitExceeded"}}'
+
+        self.in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+        try:
+            await asyncio.sleep(self._sample_latency())
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return 400, {}, b'{"error": {"message": "invalid json"}}'
+            return self._respond(payload)
+        finally:
+            self.in_flight -= 1
+
+    # ---- HTTP ----
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if method != "POST":
+                    status, extra, payload = 404, {}, b'{"error": {"message": "not found"}}'
+                else:
+                    status, extra, payload = await self._handle_request(body)
+
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                        "Content-Type: application/json",
+                        f"Content-Length: {len(payload)}"]
+                head += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        """Start serving on the current event loop; returns the endpoint URL"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v3/responses"
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self) -> str:
+        """Run the server on a background event loop; returns the endpoint URL"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mock-ark", daemon=True)
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self.start(), self._loop).result()
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        async def _close():
+            self._server.close()
+            await self._server.wait_closed()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared with bench_pipeline.py"""
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=1.0, help="Mean latency (seconds)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Uniform half-width or lognormal sigma")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Random 429 probability")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="429 when more requests are in flight (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds for 429s")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Malformed 200 probability")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args: argparse.Namespace, port: int = 0) -> MockArkServer:
+    return MockArkServer(
+        port=port,
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        rate_429=args.rate_429,
+        max_concurrency=args.max_concurrency,
+        retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ark Responses API server")
+    parser.add_argument("--port", type=int, default=8000)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.port)
+    print(f"Mock Ark server on http://{server.host}:{args.port}/api/v3/responses")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print(f"\nStopped. {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
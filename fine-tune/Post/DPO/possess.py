@@ -1,64 +1,87 @@
 import json
 
-def split_concatenated_json(text):
+CHUNK_SIZE = 1 << 16          # 每次从文件读取的字符数
+MAX_RECORD_SIZE = 16 << 20    # 单条记录的上限，超过仍无法解析则视为损坏
+WHITESPACE = " \t\r\n"
+
+
+def iter_json_objects(f, chunk_size=CHUNK_SIZE):
     """
-    从连续拼接的 JSON 对象字符串（如 {}{}{}）中，分割出每个合法的 JSON 对象字符串。
-    使用括号计数法，确保嵌套对象也能正确分割。
+    从文件对象中流式解析连续拼接的 JSON 对象（如 {}{}{}、格式化后的多行对象或 JSONL）。
+    基于 json.JSONDecoder.raw_decode，字符串中的 { } 不会影响切分；
+    每解析出一个对象就立即 yield，不需要把整个文件读入内存。
     """
-    objects = []
-    i = 0
-    n = len(text)
-    while i < n:
-        if text[i].strip() == '{':
-            # 开始一个对象
-            brace_count = 0
-            start = i
-            while i < n:
-                if text[i] == '{':
-                    brace_count += 1
-                elif text[i] == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        # 找到匹配的结束
-                        obj_str = text[start:i+1]
-                        objects.append(obj_str)
-                        break
-                i += 1
-            else:
-                raise ValueError(f"未闭合的 JSON 对象从位置 {start} 开始")
-        else:
-            i += 1
-    return objects
-
-def extract_content_and_options(json_str_list):
-    extracted = []
-    for s in json_str_list:
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    while True:
+        # 跳过对象之间的空白
+        while pos < len(buf) and buf[pos] in WHITESPACE:
+            pos += 1
+
+        if pos >= len(buf):
+            if eof:
+                return
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+            continue
+
         try:
-            obj = json.loads(s)
-            content = obj.get("content", "")
-            options = obj.get("vote", {}).get("options", [])
-            extracted.append({
-                "content": content,
-                "options": options
-            })
+            obj, end = decoder.raw_decode(buf, pos)
         except json.JSONDecodeError as e:
+            if not eof and len(buf) - pos < MAX_RECORD_SIZE:
+                # 对象可能只读入了一半：丢掉已处理部分，再读入至少与未完成部分等长的数据后重试。
+                # 未完成部分每次至少翻倍，大记录总的重复解析量与记录大小成线性关系
+                chunk = f.read(max(chunk_size, len(buf) - pos))
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            # 确实是损坏的数据：跳到下一个 { 继续
             print(f"解析失败，跳过一段数据: {e}")
+            next_start = buf.find("{", pos + 1)
+            if next_start < 0:
+                buf, pos = "", 0
+            else:
+                pos = next_start
             continue
-    return extracted
 
-def main():
-    # 读取原始文件（假定文件名为 data.txt）
-    input_file = "input.txt"
-    output_file = "output.json"
+        if end == len(buf) and not eof and not isinstance(obj, (dict, list)):
+            # 顶层的数字等标量可能被块边界截断，读入更多后重新解析
+            chunk = f.read(max(chunk_size, len(buf) - pos))
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        pos = end
+        yield obj
+
+
+def extract_content_and_options(objects):
+    """从原始帖子对象中提取 content 和投票选项"""
+    for obj in objects:
+        if not isinstance(obj, dict):
+            continue
+        yield {
+            "content": obj.get("content", ""),
+            "options": (obj.get("vote") or {}).get("options", [])
+        }
 
+
+def iter_polls(input_file):
+    """逐条读取原始数据文件中的投票帖（content + options）"""
     with open(input_file, 'r', encoding='utf-8') as f:
-        raw_text = f.read()
+        yield from extract_content_and_options(iter_json_objects(f))
+
 
-    # 分割出每个 JSON 对象字符串
-    json_strings = split_concatenated_json(raw_text)
+def main():
+    # 读取原始文件（假定文件名为 input.txt）
+    input_file = "input.txt"
+    output_file = "output.json"
 
-    # 提取所需字段
-    extracted_data = extract_content_and_options(json_strings)
+    # 流式解析并提取所需字段
+    extracted_data = list(iter_polls(input_file))
 
     # 保存结果
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -67,4 +90,4 @@ def main():
     print(f"成功提取 {len(extracted_data)} 条记录，已保存至 {output_file}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
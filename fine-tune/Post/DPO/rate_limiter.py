@@ -0,0 +1,163 @@
+"""
+Adaptive concurrency and rate limiting for LLM calls
+
+AdaptiveLimiter caps the number of in-flight requests with AIMD: every
+successful request grows the limit by 1/limit (about +1 per window of
+requests), and a 429 or timeout halves it, at most once per cooldown. A
+Retry-After header pauses all new requests until the given time. This
+keeps throughput close to the provider quota without hand-tuning
+MAX_WORKERS.
+
+TokenBudget is a token bucket that enforces a tokens-per-minute quota.
+Requests reserve an estimate up front, and the estimate is corrected once
+the response reports its actual usage.
+
+Both classes are used from a single asyncio event loop and are not
+thread-safe.
+"""
+
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before the next retry
+
+    Exponential backoff with full jitter, never shorter than the
+    server's Retry-After.
+
+    Args:
+        attempt: Zero-based attempt number that just failed
+        base: Delay scale in seconds
+        cap: Upper bound of the exponential part
+        retry_after: Seconds requested by the server, if any
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for requests to one endpoint"""
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+        cooldown: float = 2.0
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self.overloads = 0
+        self._last_decrease = 0.0
+        self._waiters = []
+
+    async def acquire(self) -> None:
+        """Wait for a free slot (and for any Retry-After pause to end)"""
+        while True:
+            wait = self.pause_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def on_success(self) -> None:
+        """Additive increase"""
+        self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+        self._wake()
+
+    def on_overload(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease on 429/timeout; pause everyone for Retry-After"""
+        now = time.monotonic()
+        self.overloads += 1
+        if retry_after:
+            self.pause_until = max(self.pause_until, now + retry_after)
+        # Requests already in flight report the same overload; shrink once per cooldown
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+            self._last_decrease = now
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class TokenBudget:
+    """Token bucket enforcing a tokens-per-minute quota"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int) -> None:
+        """Reserve an estimated number of tokens, waiting until the bucket has them"""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def adjust(self, delta: int) -> None:
+        """Correct a reservation once actual usage is known (delta = actual - estimate)"""
+        self._refill()
+        self.tokens -= delta
@@ -0,0 +1,248 @@
+"""
+Buffered JSONL output for DPO results
+
+A single writer thread drains a queue of finished examples and writes them
+through one open file handle. Lines are batched and flushed when the
+buffer reaches flush_bytes or flush_interval seconds have passed, and the
+file is fsynced at checkpoints (every checkpoint_interval seconds and on
+close). Worker threads only pay for a queue put.
+
+Output paths ending in ".zst" are zstd-compressed. Every flush ends a zstd
+frame, so the file on disk is always a valid sequence of frames and can be
+appended to on resume.
+"""
+
+import io
+import os
+import json
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from config import (
+    WRITER_FLUSH_BYTES,
+    WRITER_FLUSH_INTERVAL,
+    WRITER_CHECKPOINT_INTERVAL,
+    ZSTD_LEVEL,
+)
+
+_STOP = object()
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(".zst")
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise ImportError("zstd output needs the zstandard package: pip install zstandard")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Read records from a plain or zstd-compressed JSONL file"""
+    if is_compressed(path):
+        _require_zstandard()
+        with open(path, "rb") as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            for line in io.TextIOWrapper(reader, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def truncate_partial_line(path: str) -> int:
+    """Cut an unterminated last line left by a crash; returns bytes removed"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        # Scan backwards for the last complete line
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        f.truncate(pos)
+        return size - pos
+
+
+def truncate_partial_frame(path: str) -> int:
+    """Cut an incomplete zstd frame left by a crash; returns bytes removed"""
+    _require_zstandard()
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        data = f.read()
+
+    pos = 0
+    while pos < len(data):
+        decomp = zstandard.ZstdDecompressor().decompressobj()
+        try:
+            decomp.decompress(data[pos:])
+        except zstandard.ZstdError:
+            break
+        if not decomp.eof:
+            break
+        pos = len(data) - len(decomp.unused_data)
+
+    if pos < len(data):
+        with open(path, "rb+") as f:
+            f.truncate(pos)
+    return len(data) - pos
+
+
+def repair_tail(path: str) -> int:
+    """Make an output file appendable after a crash"""
+    if is_compressed(path):
+        return truncate_partial_frame(path)
+    return truncate_partial_line(path)
+
+
+class ResultWriter:
+    """
+    Single background writer for JSONL results
+
+    Args:
+        path: Output file; appended to, ".zst" enables zstd compression
+        on_flush: Called from the writer thread with the ids of the records
+            just flushed (e.g. to append them to the completion ledger)
+        on_checkpoint: Called after each fsync
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_bytes: int = WRITER_FLUSH_BYTES,
+        flush_interval: float = WRITER_FLUSH_INTERVAL,
+        checkpoint_interval: float = WRITER_CHECKPOINT_INTERVAL,
+        on_flush: Optional[Callable[[List[str]], None]] = None,
+        on_checkpoint: Optional[Callable[[], None]] = None,
+    ):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.on_flush = on_flush
+        self.on_checkpoint = on_checkpoint
+
+        self.records_written = 0
+        self.flushes = 0
+        self.checkpoints = 0
+        self.error = None
+
+        self._raw = open(path, "ab")
+        if is_compressed(path):
+            _require_zstandard()
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._out = compressor.stream_writer(self._raw, closefd=False)
+        else:
+            self._out = self._raw
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any], record_id: Optional[str] = None) -> None:
+        """Queue one record (thread-safe, never blocks on disk)"""
+        if self.error is not None:
+            raise RuntimeError(f"Result writer failed: {self.error}")
+        self._queue.put((record, record_id))
+
+    def close(self) -> None:
+        """Write everything still queued, fsync and close the file"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self.error is not None:
+            raise RuntimeError(f"Result writer failed: {self.error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self) -> None:
+        lines, ids, size = [], [], 0
+        last_flush = last_checkpoint = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if lines:
+                    timeout = max(last_flush + self.flush_interval - time.monotonic(), 0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+
+                if item is not None:
+                    record, record_id = item
+                    if not lines:
+                        last_flush = time.monotonic()  # Age of the oldest buffered line
+                    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                    lines.append(line)
+                    size += len(line)
+                    if record_id is not None:
+                        ids.append(record_id)
+
+                now = time.monotonic()
+                if lines and (size >= self.flush_bytes or now - last_flush >= self.flush_interval):
+                    self._flush(lines, ids)
+                    lines, ids, size = [], [], 0
+                    last_flush = now
+                if now - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint()
+                    last_checkpoint = now
+
+            self._flush(lines, ids)
+            self._checkpoint()
+        except Exception as e:
+            self.error = e
+            print(f"Error writing {self.path}: {e}")
+        finally:
+            if self._out is not self._raw:
+                self._out.close()
+            self._raw.close()
+
+    def _flush(self, lines: List[bytes], ids: List[str]) -> None:
+        if not lines:
+            return
+        self._out.write(b"".join(lines))
+        if self._out is not self._raw:
+            self._out.flush(zstandard.FLUSH_FRAME)
+        self._raw.flush()
+        self.records_written += len(lines)
+        self.flushes += 1
+        if self.on_flush and ids:
+            self.on_flush(ids)
+
+    def _checkpoint(self) -> None:
+        os.fsync(self._raw.fileno())
+        self.checkpoints += 1
+        if self.on_checkpoint:
+            self.on_checkpoint()
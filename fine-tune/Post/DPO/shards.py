@@ -0,0 +1,138 @@
+"""
+Sharded DPO generation across machines
+
+Polls are assigned to shards by a stable hash of their content, so every
+machine can read the same input and pick its own polls without any
+coordination:
+
+    python dpo_pipeline.py --num-shards 4 --shard-index 0   # machine 0
+    python dpo_pipeline.py --num-shards 4 --shard-index 1   # machine 1 ...
+
+Shard k writes {output}.shard-k-of-N with its own ledger and metrics next to
+it (e.g. dpo_dataset.shard-00-of-04.jsonl), so shards resume independently
+from a shared directory. Every shard runs near-duplicate filtering over the
+whole input before picking its polls, so all shards drop the same polls.
+
+Once all shards are done, merge them into one file:
+
+    python shards.py --output dpo_dataset.jsonl --num-shards 4
+
+The merge drops pairs that appear more than once and sorts examples by
+(poll index, pair index) from their metadata, so the result does not depend
+on the number of shards or on completion order. A ledger is written for
+the merged file as well.
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from typing import Any, Dict, Iterable, List, Tuple
+
+from config import OUTPUT_FILE
+from ledger import CompletionLedger, example_pair_id
+from result_writer import ResultWriter, iter_jsonl, repair_tail
+
+
+def poll_shard(poll: Dict[str, Any], num_shards: int) -> int:
+    """Shard index of a poll: stable across runs, machines and Python versions"""
+    content = poll.get("content", "").strip()
+    digest = hashlib.sha256(content.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def shard_output_path(output_file: str, shard_index: int, num_shards: int) -> str:
+    """dpo_dataset.jsonl -> dpo_dataset.shard-01-of-04.jsonl (.zst is kept last)"""
+    compressed = output_file.endswith(".zst")
+    path = output_file[:-len(".zst")] if compressed else output_file
+    root, ext = os.path.splitext(path)
+    width = max(2, len(str(num_shards - 1)))
+    path = f"{root}.shard-{shard_index:0{width}d}-of-{num_shards:0{width}d}{ext}"
+    return path + ".zst" if compressed else path
+
+
+def example_key(example: Dict[str, Any]) -> str:
+    """Dedupe key: the pair id, or a content hash for examples without metadata"""
+    try:
+        pid = example_pair_id(example)
+    except KeyError:
+        pid = None
+    if pid:
+        return pid
+    raw = json.dumps([example.get("prompt"), example.get("chosen"), example.get("rejected")],
+                     ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def example_order(example: Dict[str, Any], key: str) -> Tuple:
+    """Global order: input position when recorded in the metadata, then the dedupe key"""
+    metadata = example.get("metadata") or {}
+    if "poll_index" in metadata:
+        return (0, metadata["poll_index"], metadata.get("pair_index", 0), key)
+    return (1, 0, 0, key)
+
+
+def merge_shards(shard_files: Iterable[str], output_file: str) -> Dict[str, int]:
+    """
+    Merge shard outputs into one deduplicated, globally ordered file
+
+    Args:
+        shard_files: Shard output files (plain or .zst)
+        output_file: Merged output; overwritten, together with its ledger
+
+    Returns:
+        Counts of records read, duplicates dropped and examples written
+    """
+    examples: Dict[str, Tuple[Tuple, Dict[str, Any]]] = {}
+    read = 0
+    for path in shard_files:
+        repair_tail(path)
+        for example in iter_jsonl(path):
+            read += 1
+            key = example_key(example)
+            if key not in examples:
+                examples[key] = (example_order(example, key), example)
+
+    ledger = CompletionLedger(f"{output_file}.ledger")
+    ledger.reset()
+    with open(output_file, "wb"):
+        pass
+    writer = ResultWriter(output_file, on_flush=ledger.add_many, on_checkpoint=ledger.sync)
+    try:
+        for key, (_, example) in sorted(examples.items(), key=lambda item: item[1][0]):
+            writer.write(example, key)
+    finally:
+        writer.close()
+        ledger.close()
+
+    return {"read": read, "duplicates": read - len(examples), "written": len(examples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sharded DPO outputs")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="Output file the shards were run with; also the merged file")
+    parser.add_argument("--num-shards", type=int, required=True, help="Number of shards")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Merge the shards that exist instead of failing")
+    args = parser.parse_args()
+
+    shard_files: List[str] = []
+    missing = []
+    for index in range(args.num_shards):
+        path = shard_output_path(args.output, index, args.num_shards)
+        (shard_files if os.path.exists(path) else missing).append(path)
+
+    if missing and not args.allow_missing:
+        parser.error(f"missing shard output(s): {', '.join(missing)}")
+    for path in missing:
+        print(f"Warning: {path} not found, skipped")
+
+    counts = merge_shards(shard_files, args.output)
+    print(f"Merged {len(shard_files)} shard(s): {counts['read']} example(s) read, "
+          f"{counts['duplicates']} duplicate(s) dropped")
+    print(f"Wrote {counts['written']} example(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()